@@ -0,0 +1,167 @@
+# MKK Investment Tracker — portfolio snapshots
+# - Point-in-time copies of a portfolio under backups/ in its directory: one small manifest per snapshot pointing
+#   at content-addressed, zlib-compressed blobs, so identical content is stored once across all snapshots
+# - Holdings are split into BUCKETS by ticker hash; a snapshot after a few edits writes only the buckets that changed
+# - Price caches (last_prices, price_updated) are left out: they change all day and are refetched anyway
+# - Retention keeps every snapshot of the last day, then the newest per day for a month and per week for a year
+# - diff() compares bucket hashes first and only opens the buckets that differ
+# - Taking and pruning snapshots are serialized across threads and processes by backups/snapshots.lock
+
+import hashlib, json, os, threading, time, zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from storage import FileLock, atomic_write
+
+BUCKETS = 256
+PRICE_KEYS = ("last_prices", "price_updated", "last_updated")
+MIN_INTERVAL = 10*60    # automatic snapshots at most this often
+KEEP_ALL_S = 86400      # every snapshot younger than this is kept…
+DAILY_DAYS = 31         # …then the newest of each day…
+WEEKLY_WEEKS = 52       # …then the newest of each week
+KEEP_LATEST = 10        # and always the newest few, whatever their age
+GC_GRACE_S = 3600       # unreferenced blobs younger than this may belong to a snapshot being written
+
+def _canon(v: Any) -> bytes:
+    return json.dumps(v, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def _bucket(ticker: str) -> int:
+    return zlib.crc32(ticker.encode("utf-8")) % BUCKETS
+
+def validate(data: Any) -> List[str]:
+    """Problems that make `data` unfit to restore (empty if it looks like a portfolio)."""
+    if not isinstance(data, dict): return ["not a JSON object"]
+    holdings = data.get("holdings")
+    if not isinstance(holdings, dict): return ["no holdings"]
+    problems = []
+    for t, rec in holdings.items():
+        if not isinstance(rec, dict): problems.append(f"{t}: not an object"); continue
+        for f in ("shares", "total_invested"):
+            if not isinstance(rec.get(f, 0.0), (int, float)) or isinstance(rec.get(f), bool): problems.append(f"{t}: {f} is not a number")
+        if len(problems) >= 20: problems.append("…"); break
+    if not isinstance(data.get("settings", {}), dict): problems.append("settings is not an object")
+    return problems
+
+class SnapshotStore:
+    """Snapshots of one portfolio; ids sort by time."""
+    def __init__(self, portfolio_dir: str):
+        self.dir = os.path.join(portfolio_dir, "backups")
+        self.objects = os.path.join(self.dir, "objects"); self.manifests = os.path.join(self.dir, "snapshots")
+        os.makedirs(self.objects, exist_ok=True); os.makedirs(self.manifests, exist_ok=True)
+        self._busy = threading.Lock()                                      # one background take_later() at a time
+        self._lock = FileLock(os.path.join(self.dir, "snapshots.lock"))    # a take() and its prune() vs. everyone else
+        latest = self.latest()
+        self.last_ts = latest["ts"] if latest else 0.0
+
+    def _obj_path(self, h: str) -> str:
+        return os.path.join(self.objects, h[:2], h)
+
+    def _put(self, raw: bytes) -> int:
+        """Store a blob unless it's already there. Returns bytes written."""
+        h = hashlib.sha256(raw).hexdigest(); path = self._obj_path(h)
+        try: os.utime(path); return 0   # already stored: fresh again, so it gets GC's full grace period
+        except FileNotFoundError: pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        packed = zlib.compress(raw, 6); atomic_write(path, packed)
+        return len(packed)
+
+    def _get(self, h: str) -> Any:
+        with open(self._obj_path(h), "rb") as f: return json.loads(zlib.decompress(f.read()))
+
+    def _manifest(self, snap_id: str) -> Dict[str, Any]:
+        with open(os.path.join(self.manifests, snap_id + ".json"), "r", encoding="utf-8") as f: return json.load(f)
+
+    def take(self, data: Dict[str, Any], reason: str = "auto") -> Optional[Dict[str, Any]]:
+        """Snapshot `data`. Returns its manifest, or None if it's identical to the latest snapshot."""
+        top = {k: v for k, v in data.items() if k != "holdings" and k not in PRICE_KEYS}
+        buckets: Dict[int, Dict[str, Any]] = {}
+        for t, rec in data.get("holdings", {}).items(): buckets.setdefault(_bucket(t), {})[t] = rec
+        blobs = {"top": _canon(top), **{str(i): _canon(b) for i, b in sorted(buckets.items())}}
+        hashes = {k: hashlib.sha256(raw).hexdigest() for k, raw in blobs.items()}
+        with self._lock:
+            latest = self.latest()
+            if latest and latest["hashes"] == hashes: return None
+            written = sum(self._put(raw) for raw in blobs.values())
+            now = time.time(); snap_id = datetime.fromtimestamp(now).strftime("%Y%m%d-%H%M%S-%f")
+            man = {"id": snap_id, "ts": now, "reason": reason, "holdings": len(data.get("holdings", {})),
+                   "bytes": written, "hashes": hashes}
+            atomic_write(os.path.join(self.manifests, snap_id + ".json"), json.dumps(man).encode("utf-8"))
+            self.last_ts = now; self.prune(now)
+            return man
+
+    def take_later(self, load: Callable[[], Optional[Dict[str, Any]]], reason: str = "auto") -> bool:
+        """Snapshot `load()` on a background thread unless one ran within MIN_INTERVAL or is running now."""
+        if time.time() - self.last_ts < MIN_INTERVAL or not self._busy.acquire(blocking=False): return False
+        self.last_ts = time.time()   # claims the slot, so concurrent saves don't queue more
+        def run():
+            try:
+                data = load()
+                if data is not None: self.take(data, reason)
+            except (OSError, ValueError): pass
+            finally: self._busy.release()
+        threading.Thread(target=run, name="mkk-snapshot", daemon=True).start()
+        return True
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        names = sorted(n for n in os.listdir(self.manifests) if n.endswith(".json"))
+        return self._manifest(names[-1][:-5]) if names else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Manifests, newest first."""
+        out = []
+        for name in sorted(os.listdir(self.manifests), reverse=True):
+            if not name.endswith(".json"): continue
+            try: out.append(self._manifest(name[:-5]))
+            except (OSError, ValueError): continue
+        return out
+
+    def load(self, snap_id: str) -> Dict[str, Any]:
+        """The portfolio as it was at snapshot `snap_id` (without the price caches)."""
+        hashes = self._manifest(snap_id)["hashes"]
+        data = self._get(hashes["top"]); data["holdings"] = {}
+        for k, h in hashes.items():
+            if k != "top": data["holdings"].update(self._get(h))
+        return data
+
+    def diff(self, old_id: str, new_id: str) -> List[Dict[str, Any]]:
+        """What changed from snapshot old_id to new_id: one entry per holding or top-level key."""
+        a = self._manifest(old_id)["hashes"]; b = self._manifest(new_id)["hashes"]; out = []
+        for k in sorted(set(a) | set(b), key=lambda k: (k != "top", k)):
+            if a.get(k) == b.get(k): continue
+            old = self._get(a[k]) if k in a else {}; new = self._get(b[k]) if k in b else {}
+            for name in sorted(set(old) | set(new)):
+                if name not in old: change, fields = "added", []
+                elif name not in new: change, fields = "removed", []
+                elif old[name] == new[name]: continue
+                else:
+                    change = "changed"
+                    o, n = old[name], new[name]
+                    fields = sorted(f for f in set(o) | set(n) if o.get(f) != n.get(f)) if isinstance(o, dict) and isinstance(n, dict) else []
+                out.append({"item": name, "kind": "setting" if k == "top" else "holding", "change": change, "fields": fields})
+        return out
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Apply the retention policy and drop blobs no snapshot uses. Returns snapshots removed."""
+        with self._lock: return self._prune(now or time.time())
+
+    def _prune(self, now: float) -> int:
+        snaps = sorted(self.list(), key=lambda s: -s["ts"]); keep = set(); days = set(); weeks = set()
+        for i, s in enumerate(snaps):
+            age = now - s["ts"]; d = datetime.fromtimestamp(s["ts"])
+            if i < KEEP_LATEST or age <= KEEP_ALL_S: keep.add(s["id"])
+            elif age <= DAILY_DAYS * 86400:
+                if d.date() not in days: days.add(d.date()); keep.add(s["id"])
+            elif age <= WEEKLY_WEEKS * 7 * 86400:
+                if d.isocalendar()[:2] not in weeks: weeks.add(d.isocalendar()[:2]); keep.add(s["id"])
+        removed = [s for s in snaps if s["id"] not in keep]
+        for s in removed:
+            try: os.remove(os.path.join(self.manifests, s["id"] + ".json"))
+            except OSError: pass
+        if removed:
+            used = {h for s in snaps if s["id"] in keep for h in s["hashes"].values()}
+            for sub in os.listdir(self.objects):
+                for h in os.listdir(os.path.join(self.objects, sub)):
+                    path = os.path.join(self.objects, sub, h)
+                    try:
+                        if h not in used and now - os.path.getmtime(path) > GC_GRACE_S: os.remove(path)
+                    except OSError: pass
+        return len(removed)
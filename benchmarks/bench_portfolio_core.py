@@ -0,0 +1,51 @@
+# Render-path compute benchmark: per-row Python loop (pre-vectorization) vs portfolio_core
+# Usage: python benchmarks/bench_portfolio_core.py [n_holdings ...]   (default 10000)
+
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np, pandas as pd
+from portfolio_core import holdings_frame, portfolio_totals
+from synthetic import portfolio
+
+def synthetic(n: int, seed: int = 7):
+    data, prices = portfolio(n, seed)
+    return data["holdings"], prices
+
+def legacy(holdings, prices):
+    rows=[]; ada_rows=[]; total_invested=0.0; total_value=0.0; total_div=0.0
+    for tkr, rec in sorted(holdings.items()):
+        shares=float(rec.get("shares",0)); invested=float(rec.get("total_invested",0))
+        price=float(prices.get(tkr, np.nan))
+        market_value = shares*price if np.isfinite(price) else np.nan
+        divs=float(rec.get("dividends_collected",0.0))
+        overall_return = (market_value - invested if np.isfinite(market_value) else 0.0) + divs
+        ret_pct = (overall_return / invested * 100.0) if invested>0 else np.nan
+        true_ada = ((invested - divs)/shares) if shares>0 else np.nan
+        rows.append({"Ticker": tkr, "Name": rec.get("name",""), "Shares": round(shares,6), "Purchase Price": rec.get("purchase_price", np.nan),
+                     "Total Invested": invested, "Price Now": price, "Current Value": market_value, "Dividends Collected": divs,
+                     "True ADA": true_ada, "Overall Return $": overall_return, "Overall Return %": ret_pct})
+        vs_true_pct = ((price - true_ada)/true_ada*100.0) if (shares>0 and np.isfinite(price) and np.isfinite(true_ada) and true_ada!=0) else np.nan
+        ada_rows.append({"Ticker": tkr, "Shares": round(shares,6), "Total Invested": invested, "Dividends Collected": divs,
+                         "True ADA": true_ada, "Current Price": price, "Return vs True ADA %": vs_true_pct})
+        if np.isfinite(market_value): total_value += market_value
+        total_invested += invested; total_div += divs
+    # the True ADA tab used to run the same loop a second time
+    return pd.DataFrame(rows), pd.DataFrame(ada_rows), (total_invested, total_value, total_div)
+
+def vectorized(holdings, prices):
+    df = holdings_frame(holdings, prices)
+    return df, portfolio_totals(df, 0.0)
+
+def best_of(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(*args); best = min(best, time.perf_counter() - t0)
+    return best
+
+if __name__ == "__main__":
+    for n in [int(a) for a in sys.argv[1:]] or [10000]:
+        holdings, prices = synthetic(n)
+        _, _, (inv, val, div) = legacy(holdings, prices); _, tot = vectorized(holdings, prices)
+        assert np.isclose(inv, tot["total_invested"]) and np.isclose(val, tot["total_value"]) and np.isclose(div, tot["total_div"])
+        t_old = best_of(legacy, holdings, prices); t_new = best_of(vectorized, holdings, prices)
+        print(f"{n:>7} holdings  loop {t_old*1000:8.1f} ms   vectorized {t_new*1000:8.1f} ms   speedup {t_old/t_new:5.1f}x")
@@ -0,0 +1,66 @@
+# Offline stand-in for yfinance used by the benchmarks
+# - Deterministic synthetic prices and dividend histories per ticker
+# - Configurable per-request latency and failure rate; install() swaps it in for yf.Ticker / yf.download
+
+import random, sys, time, types, zlib
+import numpy as np, pandas as pd
+
+class FakeMarket:
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency; self.failure_rate = failure_rate
+        self._rng = random.Random(seed); self.requests = 0
+
+    def _request(self) -> None:
+        self.requests += 1
+        if self.latency: time.sleep(self.latency)
+        if self.failure_rate and self._rng.random() < self.failure_rate: raise ConnectionError("fake: request failed")
+
+    @staticmethod
+    def _base(ticker: str) -> float:
+        return 5.0 + zlib.crc32(ticker.encode()) % 300
+
+    def closes(self, ticker: str, start=None, end=None, days: int = 5) -> pd.Series:
+        end = pd.Timestamp(end or pd.Timestamp.today().normalize())
+        idx = pd.bdate_range(start, end, inclusive="left") if start else pd.bdate_range(end=end - pd.Timedelta(days=1), periods=days)
+        steps = np.random.default_rng(zlib.crc32(ticker.encode())).normal(0, 0.01, len(idx))
+        return pd.Series(self._base(ticker) * np.exp(np.cumsum(steps)), index=idx)
+
+    def dividends(self, ticker: str) -> pd.Series:
+        gap = [7, 30, 91, 182, 365][zlib.crc32(ticker.encode()) % 5]
+        idx = pd.date_range(end=pd.Timestamp.today().normalize(), periods=max(3, 3*365 // gap), freq=f"{gap}D")
+        return pd.Series(self._base(ticker) * 0.04 * gap / 365, index=idx, name="Dividends")
+
+    def Ticker(self, ticker: str, session=None):
+        market = self
+        class _Ticker:
+            def history(self, period="5d", interval="1d", start=None, end=None, **kw):
+                market._request()
+                return pd.DataFrame({"Close": market.closes(ticker, start, end)})
+            @property
+            def info(self):
+                market._request()
+                return {"symbol": ticker, "longName": f"{ticker} Holdings Inc.", "currency": "USD",
+                        "longBusinessSummary": f"{ticker} is a synthetic company used for offline benchmarks. " * 8}
+            @property
+            def dividends(self):
+                market._request(); return market.dividends(ticker)
+        return _Ticker()
+
+    def download(self, tickers, period="5d", interval="1d", start=None, end=None, group_by="column", **kw):
+        self._request()
+        tickers = tickers.split() if isinstance(tickers, str) else list(tickers)
+        frames = {}
+        for t in tickers:
+            if self.failure_rate and self._rng.random() < self.failure_rate: continue
+            c = self.closes(t, start, end)
+            frames[t] = pd.DataFrame({"Open": c, "High": c, "Low": c, "Close": c, "Adj Close": c, "Volume": 0})
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+def install(latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0) -> FakeMarket:
+    """Route yf.Ticker / yf.download (as used by market_data) to a FakeMarket."""
+    market = FakeMarket(latency, failure_rate, seed)
+    try: import yfinance as yf
+    except ImportError:
+        yf = types.ModuleType("yfinance"); yf.__version__ = "fake"; sys.modules["yfinance"] = yf
+    yf.Ticker = market.Ticker; yf.download = market.download
+    return market
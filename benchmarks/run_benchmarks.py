@@ -0,0 +1,119 @@
+# Offline benchmark suite — yfinance is replaced by benchmarks/fake_yfinance, nothing touches the network
+# Usage: python benchmarks/run_benchmarks.py [--sizes 10,1000,10000,50000] [--latency 0.02] [--failure-rate 0.02]
+#                                            [--max-refresh 5000] [--repeat 3] [--no-record]
+# Each result is appended to benchmarks/results.jsonl and compared with the previous run of the same case.
+
+import argparse, copy, json, os, platform, subprocess, sys, tempfile, time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE)); sys.path.insert(0, HERE)
+
+import fake_yfinance
+MARKET = fake_yfinance.install()   # before market_data is imported anywhere
+
+import storage, market_data
+import dividends as dividends_mod
+from portfolio_core import holdings_frame, portfolio_totals, merge_holdings
+from synthetic import portfolio
+
+RESULTS = os.path.join(HERE, "results.jsonl")
+REGRESSION = 1.20   # flag cases more than 20% slower than last time…
+NOISE_S = 0.005     # …and slower by more than this
+
+def git_rev() -> str:
+    try: return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception: return "unknown"
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench_storage(n: int, repeat: int, tmp: str):
+    data, _ = portfolio(n); path = os.path.join(tmp, f"portfolio_{n}.json")
+    store = storage.PortfolioStore(path)
+    yield "storage.save_full", best_of(lambda: store.compact(data), repeat)
+    yield "storage.load", best_of(lambda: storage.PortfolioStore(path).load(), repeat)
+    yield "storage.load_unchanged", best_of(store.load, repeat)
+    def flush_one():
+        s = storage.PortfolioStore(path, compact_records=10**9); d, rev = s.snapshot()
+        t = next(iter(d["holdings"])); d["holdings"][t]["dividends_collected"] += 1.0
+        s.save(d, rev)
+    yield "storage.load_and_flush_one", best_of(flush_one, repeat)
+
+def bench_compute(n: int, repeat: int):
+    data, prices = portfolio(n)
+    # the series the dividend cache would hold, taken straight from the fake market (no latency/failures)
+    series = {t: [[d.strftime("%Y-%m-%d"), float(a)] for d, a in MARKET.dividends(t).items()] for t in data["holdings"]}
+    long = dividends_mod.long_frame(series)
+    def render():
+        df = holdings_frame(data["holdings"], prices); portfolio_totals(df, data["cash_uninvested"])
+        dividends_mod.analytics(long, df)
+    yield "compute.render_path", best_of(render, repeat)
+    rates = {"USD": 1.0, "EUR": 1.08, "GBP": 1.27}
+    mixed = {t: {**r, "currency": ("USD", "EUR", "GBP")[i % 3]} for i, (t, r) in enumerate(data["holdings"].items())}
+    yield "compute.fx_convert", best_of(lambda: holdings_frame(mixed, prices, "EUR", rates), repeat)
+
+def bench_merge(n: int, repeat: int):
+    data, _ = portfolio(n); incoming = copy.deepcopy(data["holdings"])
+    half = dict(list(incoming.items())[: n // 2])
+    def merge():
+        target = dict(list(data["holdings"].items())[n // 2:])
+        merge_holdings(target, copy.copy(half)); merge_holdings(target, copy.copy(incoming), overwrite=True)
+    yield "migration.merge", best_of(merge, repeat)
+
+def bench_network(n: int, max_refresh: int):
+    if n > max_refresh: return
+    data, _ = portfolio(n); tickers = list(data["holdings"])
+    MARKET.requests = 0; t0 = time.perf_counter(); _, failed = market_data.fetch_prices(tickers)
+    yield "prices.refresh", time.perf_counter() - t0, {"requests": MARKET.requests, "failed": len(failed)}
+    sub = tickers[:min(n, 500)]
+    MARKET.requests = 0; t0 = time.perf_counter()
+    errors = sum(1 for _, _, err in market_data.fetch_concurrent(market_data.fetch_dividends, sub, backoff=0.01) if err)
+    yield "prefetch.dividends", time.perf_counter() - t0, {"tickers": len(sub), "requests": MARKET.requests, "failed": errors}
+
+def previous_results():
+    last = {}
+    if os.path.exists(RESULTS):
+        with open(RESULTS, "r", encoding="utf-8") as f:
+            for line in f:
+                try: r = json.loads(line)
+                except ValueError: continue
+                last[(r["case"], r["size"], r["latency"], r["failure_rate"])] = r
+    return last
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--sizes", default="10,1000,10000,50000")
+    ap.add_argument("--latency", type=float, default=0.02, help="seconds per fake request")
+    ap.add_argument("--failure-rate", type=float, default=0.02)
+    ap.add_argument("--max-refresh", type=int, default=5000, help="largest portfolio for the network cases")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no-record", action="store_true")
+    args = ap.parse_args(argv)
+    MARKET.latency = args.latency; MARKET.failure_rate = args.failure_rate
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    prev = previous_results(); rev = git_rev(); regressions = 0
+    meta = {"ts": datetime.now().isoformat(timespec="seconds"), "git": rev, "python": platform.python_version(),
+            "latency": args.latency, "failure_rate": args.failure_rate}
+    print(f"{'case':<28}{'size':>8}{'seconds':>11}{'µs/item':>10}   vs last")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            results = [*bench_storage(n, args.repeat, tmp), *bench_compute(n, args.repeat), *bench_merge(n, args.repeat),
+                       *bench_network(n, args.max_refresh)]
+            for case, secs, *extra in results:
+                rec = {**meta, "case": case, "size": n, "seconds": round(secs, 6), **(extra[0] if extra else {})}
+                old = prev.get((case, n, args.latency, args.failure_rate)); cmp = ""
+                if old:
+                    ratio = secs / old["seconds"] if old["seconds"] else float("inf")
+                    cmp = f"{(ratio-1)*100:+6.1f}% ({old['git']})"
+                    if ratio > REGRESSION and secs - old["seconds"] > NOISE_S: cmp += "  REGRESSION"; regressions += 1
+                print(f"{case:<28}{n:>8}{secs:>11.4f}{secs/n*1e6:>10.1f}   {cmp}")
+                if not args.no_record:
+                    with open(RESULTS, "a", encoding="utf-8") as f: f.write(json.dumps(rec) + "\n")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+# Synthetic portfolios for the offline benchmarks
+
+from typing import Any, Dict, Tuple
+import numpy as np
+
+def portfolio(n: int, seed: int = 7, missing_price: float = 0.02) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """A portfolio_data.json-shaped dict with n holdings, plus a price for most of them."""
+    rng = np.random.default_rng(seed)
+    shares = rng.uniform(1, 500, n); cost = rng.uniform(5, 300, n); div_frac = rng.uniform(0, 0.2, n)
+    has_price = rng.random(n) > missing_price; moves = rng.uniform(0.5, 2.0, n)
+    holdings, prices = {}, {}
+    for i in range(n):
+        t = f"T{i:05d}"; inv = float(shares[i]*cost[i])
+        holdings[t] = {"name": f"{t} Holdings Inc.", "shares": float(shares[i]), "total_invested": inv,
+                       "purchase_price": float(cost[i]), "dividends_collected": float(div_frac[i])*inv,
+                       "last_div_amount": 0.0, "last_div_date": "", "summary": "",
+                       "created": "2024-01-02T09:30:00"}
+        if has_price[i]: prices[t] = float(cost[i]*moves[i])
+    data = {"holdings": holdings, "cash_uninvested": 1000.0,
+            "settings": {"currency": "USD", "auto_price": True, "fetch_workers": 8},
+            "last_prices": dict(prices), "last_updated": None, "price_updated": {}, "version": "1.9.0"}
+    return data, prices
@@ -0,0 +1,61 @@
+# MKK Investment Tracker — dividend analytics
+# - Works on the cached per-ticker dividend series ([[YYYY-MM-DD, amount], ...]); no network access here
+# - Payout frequency, trailing-12-month dividends, yield on cost / on market value and forward income,
+#   computed for all holdings at once with group-bys over one long frame
+
+from typing import Dict, List
+import pandas as pd, numpy as np
+
+FREQ_LABELS = ["Weekly", "Monthly", "Quarterly", "Semiannual", "Annual"]
+FREQ_MAX_GAP = [9, 45, 115, 220, 400]   # median days between payments
+PER_YEAR = {"Weekly": 52, "Monthly": 12, "Quarterly": 4, "Semiannual": 2, "Annual": 1}
+IRREGULAR = "Irregular/None"
+
+def long_frame(series: Dict[str, List[list]]) -> pd.DataFrame:
+    """All dividend payments as one (Ticker, Date, Amount) frame, sorted by ticker then date."""
+    tickers = [t for t, s in series.items() for _ in (s or [])]
+    if not tickers: return pd.DataFrame({"Ticker": pd.Series(dtype=object), "Date": pd.Series(dtype="datetime64[ns]"), "Amount": pd.Series(dtype=float)})
+    rows = [r for s in series.values() for r in (s or [])]
+    df = pd.DataFrame({"Ticker": tickers, "Date": pd.to_datetime([r[0] for r in rows]), "Amount": np.array([r[1] for r in rows], dtype=float)})
+    return df.sort_values(["Ticker", "Date"], kind="stable").reset_index(drop=True)
+
+def frequencies(div: pd.DataFrame, tickers, today=None) -> pd.Series:
+    """Payout frequency label per ticker from the median gap between payments over the last 3 years."""
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    out = pd.Series(IRREGULAR, index=pd.Index(list(tickers), name="Ticker"), dtype=object)
+    if div.empty: return out
+    total = div.groupby("Ticker").size()
+    recent = div[div["Date"] >= today - pd.Timedelta(days=3*365)]
+    gaps = recent.groupby("Ticker")["Date"].diff().dt.days
+    stats = pd.DataFrame({"Ticker": recent["Ticker"], "gap": gaps}).groupby("Ticker").agg(n=("Ticker", "size"), med=("gap", "median"))
+    stats = stats[(stats["n"] >= 3) & (total.reindex(stats.index) >= 3)]
+    labels = np.select([stats["med"] <= g for g in FREQ_MAX_GAP], FREQ_LABELS, IRREGULAR)
+    out.update(pd.Series(labels, index=stats.index))
+    return out
+
+def analytics(div: pd.DataFrame, holdings: pd.DataFrame, today=None) -> pd.DataFrame:
+    """Per holding: frequency, TTM dividends/share, yields and forward income.
+
+    `holdings` needs Ticker, Shares, Total Invested and Price Now columns (portfolio_core.holdings_frame).
+    """
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    tickers = holdings["Ticker"].tolist()
+    freq = frequencies(div, tickers, today)
+    ttm = div[div["Date"] > today - pd.Timedelta(days=365)].groupby("Ticker")["Amount"].sum().reindex(tickers).fillna(0.0)
+    last = div.groupby("Ticker")["Amount"].last().reindex(tickers)
+    last_date = div.groupby("Ticker")["Date"].last().reindex(tickers)
+    per_year = freq.map(PER_YEAR).astype(float)
+    # regular payers: latest payment × payments per year; otherwise assume the last 12 months repeat
+    fwd = np.where(per_year.notna() & last.notna(), last.to_numpy(dtype=float) * per_year.fillna(0).to_numpy(), ttm.to_numpy())
+    shares = holdings["Shares"].to_numpy(dtype=float); invested = holdings["Total Invested"].to_numpy(dtype=float)
+    price = holdings["Price Now"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yoc = np.where(invested > 0, ttm.to_numpy() * shares / invested * 100.0, np.nan)
+        yom = np.where(price > 0, ttm.to_numpy() / price * 100.0, np.nan)
+        fwd_yield = np.where(price > 0, fwd / price * 100.0, np.nan)
+    return pd.DataFrame({
+        "Ticker": tickers, "Frequency": freq.to_numpy(), "Last Payment": last.to_numpy(dtype=float),
+        "Last Payment Date": last_date.dt.date.to_numpy(), "TTM / Share": ttm.to_numpy(),
+        "Yield on Cost %": yoc, "Yield on Market %": yom, "Forward Yield %": fwd_yield,
+        "Fwd Annual Income": fwd * shares, "Fwd Monthly Income": fwd * shares / 12.0,
+    })
@@ -0,0 +1,67 @@
+# MKK Investment Tracker — currency conversion
+# - A holding's money is in its listing currency: set on the holding, else inferred from the ticker's exchange suffix
+# - Rates are USD per unit from Yahoo "<CCY>USD=X" quotes, so they are fetched in the same batch as prices
+# - Conversion multiplies whole columns by one per-row factor built from the unique currencies; no per-cell lookups
+# - No network here
+
+from typing import Dict, Iterable, List, Sequence
+import pandas as pd, numpy as np
+
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CAD", "CHF", "AUD", "HKD"]
+SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "CAD": "CA$", "CHF": "CHF ", "AUD": "A$", "HKD": "HK$"}
+SUFFIX_CURRENCY = {
+    "L": "GBP", "IL": "GBP", "TO": "CAD", "V": "CAD", "NE": "CAD", "CN": "CAD",
+    "DE": "EUR", "F": "EUR", "PA": "EUR", "AS": "EUR", "MI": "EUR", "MC": "EUR", "BR": "EUR", "LS": "EUR",
+    "HE": "EUR", "IR": "EUR", "VI": "EUR", "SW": "CHF", "T": "JPY", "HK": "HKD", "AX": "AUD", "NZ": "NZD",
+    "ST": "SEK", "OL": "NOK", "CO": "DKK", "SI": "SGD", "KS": "KRW", "NS": "INR", "BO": "INR", "SA": "BRL",
+    "MX": "MXN", "JO": "ZAR", "TA": "ILS",
+}
+SUBUNIT_SUFFIXES = {"L", "JO", "TA"}   # quoted in pence / cents / agorot, not in the currency itself
+
+def symbol(ccy: str) -> str:
+    return SYMBOLS.get(ccy, ccy + " ")
+
+def _suffixes(tickers: Sequence[str]) -> np.ndarray:
+    codes, uniq = pd.factorize(np.asarray(tickers, dtype=object))
+    return np.array([t.rpartition(".")[2] if "." in t else "" for t in uniq], dtype=object)[codes] if len(codes) else np.array([], dtype=object)
+
+def listing_currency(tickers: Sequence[str]) -> np.ndarray:
+    """Currency per ticker from its exchange suffix (e.g. .L -> GBP, .TO -> CAD); US listings have none."""
+    suf = _suffixes(tickers); codes, uniq = pd.factorize(suf)
+    return np.array([SUFFIX_CURRENCY.get(s, "USD") for s in uniq], dtype=object)[codes] if len(codes) else suf
+
+def quote_scale(tickers: Sequence[str]) -> np.ndarray:
+    """Factor taking a quoted price into its currency: 0.01 on exchanges that quote in pence/cents, else 1."""
+    suf = _suffixes(tickers)
+    return np.where(np.isin(suf, list(SUBUNIT_SUFFIXES)), 0.01, 1.0) if len(suf) else np.array([], dtype=float)
+
+def holding_currencies(raw: pd.DataFrame, tickers: Sequence[str]) -> np.ndarray:
+    """Per holding: its `currency` field where set, else the listing currency of its ticker."""
+    inferred = listing_currency(tickers)
+    if "currency" not in raw or not len(inferred): return inferred
+    own = raw["currency"].to_numpy(dtype=object)
+    return np.where(pd.notna(own) & (own != ""), own, inferred)
+
+def rate_symbol(ccy: str) -> str:
+    return f"{ccy}USD=X"
+
+def rate_symbols(currencies: Iterable[str]) -> List[str]:
+    return [rate_symbol(c) for c in sorted(set(currencies)) if c != "USD"]
+
+def usd_rates(quotes: Dict[str, float], currencies: Iterable[str]) -> Dict[str, float]:
+    """USD per unit for each currency that has a quote (USD itself is always 1)."""
+    out = {"USD": 1.0}
+    for c in set(currencies):
+        p = quotes.get(rate_symbol(c))
+        if c != "USD" and p is not None and np.isfinite(p) and p > 0: out[c] = float(p)
+    return out
+
+def factors(ccy: np.ndarray, target: str, usd: Dict[str, float]) -> np.ndarray:
+    """Multiplier taking each row's amount from its currency into `target`; NaN where a rate is missing."""
+    codes, uniq = pd.factorize(np.asarray(ccy, dtype=object))
+    per = np.array([usd.get(c, np.nan) for c in uniq], dtype=float) / usd.get(target, np.nan)
+    return per[codes] if len(codes) else np.array([], dtype=float)
+
+def convert(df: pd.DataFrame, columns: Iterable[str], factor: np.ndarray) -> pd.DataFrame:
+    """`df` with each of `columns` multiplied by the per-row factor."""
+    return df.assign(**{c: df[c].to_numpy(dtype=float) * factor for c in columns if c in df})
@@ -0,0 +1,284 @@
+# MKK Investment Tracker — broker statement import
+# - CSV transaction histories and OFX/QFX statements are read in chunks into compact per-row arrays
+#   (ticker id, kind, shares, amount, day); the raw text never has to be held as a DataFrame
+# - Per-ticker totals come from vectorized group-bys over those arrays; the dry-run diff replays the
+#   transactions on copies of the ledger aggregates, so it shows exactly what apply() will write
+# - apply() appends everything to the ledger in one call and updates holdings for a single save
+# - Every row gets a 64-bit fingerprint (ticker, type, date, shares, amount); rows the ledger already has are
+#   skipped, so re-importing a statement, or one that overlaps an earlier one, only adds what is new
+# - Rows dated before a ticker's opening position (its latest Set position) are history that position already
+#   includes: buys and sells show in the valuation history, but none of them change the position or its dividends
+
+import codecs, csv, hashlib, io, re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np, pandas as pd
+import ledger as ledger_mod
+
+CHUNK_ROWS = 50_000
+OFX_BLOCK = 1 << 20
+
+# normalized CSV header -> field; the first alias present wins
+ALIASES = {
+    "date": ["trade date", "run date", "transaction date", "activity date", "date", "settlement date"],
+    "ticker": ["symbol", "ticker", "security symbol", "ticker symbol"],
+    "action": ["action", "transaction type", "type", "activity", "transaction", "description"],
+    "shares": ["quantity", "shares", "qty", "units"],
+    "price": ["price", "share price", "unit price"],
+    "amount": ["amount", "net amount", "total", "total amount", "proceeds", "value"],
+    "fees": ["commission", "fees", "fee", "commissions and fees"],
+}
+OFX_KINDS = {"BUYSTOCK": ledger_mod.BUY, "BUYMF": ledger_mod.BUY, "BUYOTHER": ledger_mod.BUY, "REINVEST": ledger_mod.BUY,
+             "SELLSTOCK": ledger_mod.SELL, "SELLMF": ledger_mod.SELL, "SELLOTHER": ledger_mod.SELL,
+             "INCOME": ledger_mod.DIV}
+_TAG = re.compile(r"<(/?)([A-Z0-9.]+)>([^<]*)")
+
+def _header_key(name: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9]+", " ", str(name).lower().replace("($)", ""))).strip()
+
+def _per_unique(s: pd.Series, fn) -> np.ndarray:
+    # symbols, actions and dates repeat a lot: run the string work once per distinct value
+    codes, uniq = pd.factorize(s.fillna("").astype(str))
+    return np.asarray(fn(pd.Series(uniq, dtype=object)))[codes] if len(uniq) else np.zeros(0, dtype=object)
+
+def normalize_tickers(s: pd.Series) -> pd.Series:
+    """Upper-case, strip broker decorations ('$', trailing '*') and write share classes the Yahoo way (BRK/B -> BRK-B)."""
+    def norm(u: pd.Series) -> pd.Series:
+        u = u.str.strip().str.upper().str.replace(r"^\$|\*+$", "", regex=True)
+        return u.str.replace(r"[\s/]+", "-", regex=True)
+    return pd.Series(_per_unique(s, norm), index=s.index, dtype=object)
+
+def _money(s: pd.Series) -> np.ndarray:
+    out = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float)
+    bad = np.isnan(out) & s.notna().to_numpy()
+    if bad.any():   # "$1,234.50", "(12.00)" and the like
+        t = s[bad].astype(str).str.strip().str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+        out[bad] = pd.to_numeric(t.str.replace(r"[,$\s]", "", regex=True), errors="coerce").to_numpy(dtype=float)
+    return out
+
+def _days(s: pd.Series, fmt: Optional[str] = "mixed") -> np.ndarray:
+    """Days since 1970-01-01; -1 where the value is not a date (footer lines, disclaimers)."""
+    def parse(u: pd.Series) -> np.ndarray:
+        dt = pd.to_datetime(u, errors="coerce", format=fmt)
+        return np.where(dt.notna(), dt.to_numpy().astype("datetime64[D]").astype(np.int64), -1)
+    return _per_unique(s, parse).astype(np.int64)
+
+def classify(action: pd.Series) -> np.ndarray:
+    """Ledger kind per free-text broker action (0 = not a buy, sell or dividend)."""
+    def kinds(u: pd.Series) -> np.ndarray:
+        a = u.str.lower()
+        return np.select([a.str.contains("reinvest"), a.str.contains(r"\bbuy|bought|purchase"),
+                          a.str.contains(r"\bsell|sold|redemption"), a.str.contains(r"div|distribution")],
+                         [ledger_mod.BUY, ledger_mod.BUY, ledger_mod.SELL, ledger_mod.DIV], 0)
+    return _per_unique(action, kinds).astype(np.int8)
+
+class Statement:
+    """Normalized transactions of one export, as parallel arrays in file order."""
+    def __init__(self, source: str = ""):
+        self.source = source
+        self.names: List[str] = []; self._id: Dict[str, int] = {}
+        self._parts: List[Tuple[np.ndarray, ...]] = []
+        self.rows = 0; self.skipped = 0
+
+    def add(self, tickers: pd.Series, kinds: np.ndarray, shares: np.ndarray, amounts: np.ndarray, days: np.ndarray) -> None:
+        self.rows += len(tickers)
+        keep = (kinds > 0) & (days >= 0) & (tickers.to_numpy(dtype=object) != "") & np.isfinite(amounts) & np.isfinite(shares)
+        self.skipped += int((~keep).sum())
+        if not keep.any(): return
+        codes, uniq = pd.factorize(tickers[keep])
+        ids = np.array([self._id.setdefault(t, len(self._id)) for t in uniq], dtype=np.int32)
+        if len(self._id) > len(self.names): self.names = list(self._id)
+        self._parts.append((ids[codes], kinds[keep].astype(np.int8), np.abs(shares[keep]).astype(float),
+                            np.abs(amounts[keep]).astype(float), days[keep].astype(np.int32)))
+
+    def rename(self, mapping: Dict[str, str]) -> None:
+        """Replace security ids (OFX CUSIPs) by tickers; ids that map to the same ticker are merged."""
+        self.names = [mapping.get(n, n) for n in self.names]
+        uniq = list(dict.fromkeys(self.names)); pos = {t: i for i, t in enumerate(uniq)}
+        remap = np.array([pos[n] for n in self.names], dtype=np.int32)
+        self._parts = [(remap[p[0]],) + p[1:] for p in self._parts]
+        self.names = uniq; self._id = pos
+
+    def arrays(self) -> Tuple[np.ndarray, ...]:
+        """(tid, kind, shares, amount, day), oldest first (stable, so same-day rows keep file order)."""
+        if not self._parts: return tuple(np.zeros(0, dtype=d) for d in (np.int32, np.int8, float, float, np.int32))
+        cols = [np.concatenate([p[i] for p in self._parts]) for i in range(5)]
+        self._parts = [tuple(cols)]
+        order = np.argsort(cols[4], kind="stable")
+        return tuple(c[order] for c in cols)
+
+    def __len__(self) -> int:
+        return sum(len(p[0]) for p in self._parts)
+
+    def totals(self) -> pd.DataFrame:
+        """Per ticker: transaction count, date range, shares/amounts bought and sold, dividends."""
+        tid, kind, shares, amount, day = self.arrays()
+        n = len(self.names)
+        def by(mask, w): return np.bincount(tid[mask], weights=w[mask], minlength=n)
+        first = np.full(n, np.iinfo(np.int32).max); np.minimum.at(first, tid, day)
+        last = np.full(n, -1); np.maximum.at(last, tid, day)
+        buy, sell, div = kind == ledger_mod.BUY, kind == ledger_mod.SELL, kind == ledger_mod.DIV
+        return pd.DataFrame({
+            "Ticker": self.names, "Transactions": np.bincount(tid, minlength=n),
+            "First": pd.to_datetime(first, unit="D").date, "Last": pd.to_datetime(last, unit="D").date,
+            "Bought": by(buy, shares), "Cost": by(buy, amount), "Sold": by(sell, shares), "Proceeds": by(sell, amount),
+            "Dividends": by(div, amount)})
+
+def _find_header(text: io.TextIOBase, scan: int = 50) -> Tuple[int, List[str]]:
+    """Line number and fields of the header row (brokers put account info above it)."""
+    for i, line in enumerate(text):
+        if i >= scan: break
+        fields = next(csv.reader([line]), [])
+        keys = {_header_key(f) for f in fields}
+        if keys & set(ALIASES["ticker"]) and keys & set(ALIASES["date"]): return i, fields
+    raise ValueError("No header row with a date and a symbol column found.")
+
+def read_csv(raw: io.BufferedIOBase, chunk_rows: int = CHUNK_ROWS, source: str = "") -> Statement:
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+    skip, fields = _find_header(text)
+    by_key = {}
+    for f in fields: by_key.setdefault(_header_key(f), f)
+    cols = {field: next((by_key[a] for a in names if a in by_key), None) for field, names in ALIASES.items()}
+    if cols["action"] is None and cols["shares"] is None: raise ValueError("Need an action/type or a quantity column.")
+    text.detach(); raw.seek(0)
+    use = list(dict.fromkeys(c for c in cols.values() if c is not None))
+    out = Statement(source)
+    reader = pd.read_csv(raw, skiprows=skip, usecols=use, dtype=str, chunksize=chunk_rows, encoding="utf-8-sig",
+                         on_bad_lines="skip", skip_blank_lines=True)
+    for chunk in reader:
+        def col(field): return chunk[cols[field]] if cols[field] is not None else pd.Series(np.nan, index=chunk.index)
+        qty = _money(col("shares"))
+        if cols["action"] is not None: kinds = classify(col("action"))
+        else: kinds = np.select([qty > 0, qty < 0], [ledger_mod.BUY, ledger_mod.SELL], 0).astype(np.int8)
+        amount = _money(col("amount"))
+        derived = np.abs(qty) * _money(col("price"))
+        fees = np.nan_to_num(_money(col("fees")))
+        # no amount column/value: quantity × price, fees added to buys and taken off sales
+        derived += np.where(kinds == ledger_mod.BUY, np.abs(fees), np.where(kinds == ledger_mod.SELL, -np.abs(fees), 0.0))
+        amount = np.where(np.isfinite(amount), amount, derived)
+        qty = np.where(kinds == ledger_mod.DIV, 0.0, qty)
+        out.add(normalize_tickers(col("ticker")), kinds, qty, amount, _days(col("date")))
+    return out
+
+def _ofx_tokens(raw: io.BufferedIOBase) -> Iterator[Tuple[bool, str, str]]:
+    """(closing, TAG, text) for every tag, read block by block."""
+    decode = codecs.getincrementaldecoder("utf-8")(errors="replace"); tail = ""
+    while True:
+        block = raw.read(OFX_BLOCK)
+        buf = tail + decode.decode(block or b"", final=not block)
+        # a tag's text runs up to the next "<", so the last one may continue in the next block
+        cut = max(buf.rfind("<"), 0) if block else len(buf)
+        for m in _TAG.finditer(buf, 0, cut): yield m.group(1) == "/", m.group(2).upper(), m.group(3).strip()
+        if not block: return
+        tail = buf[cut:]
+
+def read_ofx(raw: io.BufferedIOBase, chunk_rows: int = CHUNK_ROWS, source: str = "") -> Statement:
+    out = Statement(source); secs: Dict[str, str] = {}
+    rows: Dict[str, list] = {"ticker": [], "kind": [], "shares": [], "amount": [], "day": []}
+    def emit():
+        if rows["ticker"]:
+            out.add(pd.Series(rows["ticker"], dtype=object), np.array(rows["kind"], dtype=np.int8),
+                    np.array(rows["shares"], dtype=float), np.array(rows["amount"], dtype=float),
+                    _days(pd.Series(rows["day"], dtype=object), "%Y%m%d"))
+            for v in rows.values(): v.clear()
+    txn: Optional[Dict[str, Any]] = None; sec: Optional[Dict[str, str]] = None
+    for closing, tag, val in _ofx_tokens(raw):
+        if tag in OFX_KINDS:
+            if not closing: txn = {"kind": OFX_KINDS[tag]}
+            elif txn is not None:
+                if txn["kind"] != ledger_mod.DIV or txn.get("INCOMETYPE", "DIV") == "DIV":
+                    rows["ticker"].append(txn.get("UNIQUEID", "")); rows["kind"].append(txn["kind"])
+                    rows["shares"].append(0.0 if txn["kind"] == ledger_mod.DIV else _float(txn.get("UNITS")))
+                    rows["amount"].append(_float(txn.get("TOTAL"))); rows["day"].append(txn.get("DTTRADE", "")[:8])
+                else: out.skipped += 1; out.rows += 1
+                txn = None
+                if len(rows["ticker"]) >= chunk_rows: emit()
+        elif tag == "SECINFO":
+            if not closing: sec = {}
+            else:
+                if sec and sec.get("UNIQUEID") and sec.get("TICKER"): secs[sec["UNIQUEID"]] = sec["TICKER"]
+                sec = None
+        elif not closing and val:
+            if txn is not None: txn.setdefault(tag, val)
+            elif sec is not None: sec.setdefault(tag, val)
+    emit()
+    if secs: out.rename(dict(zip(secs, normalize_tickers(pd.Series(list(secs.values()), dtype=object)))))
+    return out
+
+def _float(v: Optional[str]) -> float:
+    try: return float(v)
+    except (TypeError, ValueError): return float("nan")
+
+def read_statement(raw: io.BufferedIOBase, name: str, chunk_rows: int = CHUNK_ROWS) -> Statement:
+    """Parse a CSV or OFX/QFX export, picked by file name."""
+    if name.lower().endswith((".ofx", ".qfx")): return read_ofx(raw, chunk_rows, name)
+    return read_csv(raw, chunk_rows, name)
+
+def _records(stmt: Statement) -> Tuple[list, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    tid, kind, shares, amount, day = stmt.arrays()
+    return np.asarray(stmt.names, dtype=object)[tid].tolist(), kind, shares, amount, day
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer; uint64 arithmetic wraps
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+def fingerprints(stmt: Statement) -> np.ndarray:
+    """One key per row of arrays(): equal for rows with the same ticker, type, date, shares and amount."""
+    tid, kind, shares, amount, day = stmt.arrays()
+    names = np.array([int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+                      for t in stmt.names], dtype=np.uint64)
+    h = names[tid] if len(names) else np.zeros(0, dtype=np.uint64)
+    for v in (kind.astype(np.int64), day.astype(np.int64), np.round(shares * 1e6).astype(np.int64),
+              np.round(amount * 100).astype(np.int64)):
+        h = _mix(h ^ v.view(np.uint64))
+    return h
+
+def diff(stmt: Statement, holdings: Dict[str, Dict[str, Any]], ledger: "ledger_mod.Ledger") -> pd.DataFrame:
+    """Dry run: per imported ticker, position before and after the import.
+
+    New counts the rows not imported before; Before Opening those of them dated before the ticker's
+    opening position, which it already includes.
+    """
+    tid, kind, shares, amount, day = stmt.arrays(); fresh = ledger.unseen(fingerprints(stmt))
+    tickers = np.asarray(stmt.names, dtype=object)[tid[fresh]].tolist()
+    after = ledger.preview(tickers, kind[fresh], shares[fresh], amount[fresh], day[fresh])
+    tot = stmt.totals().set_index("Ticker")
+    names = stmt.names; n = len(names)
+    since = np.array([ledger.agg.get(t, {}).get("since") for t in names], dtype=float)   # None -> nan
+    early = fresh & (day < since[tid])
+    new_rows = np.bincount(tid[fresh], minlength=n)
+    after = {t: after[t] if t in after else ledger.position(t) for t in names}
+    def before(field): return np.array([float(holdings.get(t, {}).get(field, 0) or 0) for t in names])
+    def new(field): return np.array([after[t][field] for t in names])
+    sh_after = new("shares"); exists = np.array([t in holdings for t in names])
+    status = np.select([new_rows == 0, ~exists & (sh_after > ledger_mod.EPS), ~exists, sh_after <= ledger_mod.EPS],
+                       ["already imported", "new", "skipped (closed)", "closed"], "updated")
+    return pd.DataFrame({
+        "Ticker": names, "Change": status, "Transactions": tot["Transactions"].to_numpy(),
+        "New": new_rows, "Before Opening": np.bincount(tid[early], minlength=n),
+        "Shares": before("shares"), "Shares After": np.round(sh_after, 6),
+        "Invested": before("total_invested"), "Invested After": np.round(new("invested"), 2),
+        "Dividends": before("dividends_collected"), "Dividends After": np.round(new("dividends"), 2),
+        "Realized": np.round(new("realized"), 2),
+    }).sort_values("Ticker", kind="stable").reset_index(drop=True)
+
+def apply(stmt: Statement, holdings: Dict[str, Dict[str, Any]], ledger: "ledger_mod.Ledger",
+          created: str = "") -> Tuple[int, int, int]:
+    """Add the statement's new transactions to the ledger and update holdings in place.
+
+    Returns (transactions added, holdings added, holdings updated). Rows imported before are skipped;
+    new tickers get a holding only if they still have shares after the import.
+    """
+    n = ledger.append(*_records(stmt), keys=fingerprints(stmt))
+    if not n: return 0, 0, 0
+    added = updated = 0
+    for t in stmt.names:
+        if t in holdings: updated += 1
+        elif ledger.agg.get(t, {}).get("shares", 0.0) > ledger_mod.EPS:
+            holdings[t] = {"name": "", "shares": 0.0, "total_invested": 0.0, "purchase_price": None,
+                           "dividends_collected": 0.0, "summary": "", "last_div_amount": 0.0, "last_div_date": "",
+                           "created": created}
+            added += 1
+    ledger.sync(holdings, stmt.names)
+    return n, added, updated
@@ -0,0 +1,231 @@
+# MKK Investment Tracker — transaction ledger
+# - Buys, sells, dividends and manual corrections as fixed-width binary records (ledger.bin), append-only
+# - Per-ticker aggregates (shares, invested, dividends, realized, FIFO lots) checkpointed in ledger_state.json
+#   and advanced only by the records appended since the checkpoint — nothing is rescanned on render
+# - Holdings' shares / total_invested / dividends_collected are kept in sync from these aggregates
+# - A Set position (or Close) stands for everything dated before it, dividends included: entries dated earlier that
+#   are appended later (an imported history, a back-dated trade) are kept as history but change neither the position
+#   nor its dividends; the valuation history reads them the same way
+# - Imported entries are appended with a key (ledger_keys.npy), so importing the same rows again adds nothing
+# - One ledger per portfolio directory; appends are serialized across sessions and processes by ledger.lock
+
+import copy, io, json, os
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np, pandas as pd
+from storage import FileLock, atomic_write
+
+BUY, SELL, DIV, SET, CLOSE = 1, 2, 3, 4, 5
+KINDS = {BUY: "Buy", SELL: "Sell", DIV: "Dividend", SET: "Set position", CLOSE: "Close"}
+RECORD = np.dtype([("day", "<i4"), ("tid", "<i4"), ("kind", "i1"), ("shares", "<f8"), ("amount", "<f8")])
+EPS = 1e-9
+
+def to_day(d) -> int:
+    if isinstance(d, str): d = date.fromisoformat(d[:10])
+    return (d - date(1970, 1, 1)).days
+
+def _empty() -> Dict[str, Any]:
+    # since: day of the latest SET/CLOSE (None: never); entries dated before it are already accounted for
+    return {"shares": 0.0, "invested": 0.0, "dividends": 0.0, "realized": 0.0, "lots": [], "events": 0, "since": None}
+
+def _apply_one(a: Dict[str, Any], kind: int, shares: float, amount: float, day: int) -> None:
+    a["events"] += 1
+    if a.get("since") is not None and day < a["since"]: return
+    if kind == BUY:
+        a["lots"].append([day, shares, amount]); a["shares"] += shares; a["invested"] += amount
+    elif kind == SELL:
+        left = shares; cost = 0.0
+        while left > EPS and a["lots"]:
+            lot = a["lots"][0]; take = min(left, lot[1]); part = lot[2] * take / lot[1] if lot[1] > 0 else 0.0
+            cost += part; lot[1] -= take; lot[2] -= part; left -= take
+            if lot[1] <= EPS: a["lots"].pop(0)
+        a["shares"] = max(a["shares"] - shares, 0.0); a["invested"] -= cost; a["realized"] += amount - cost
+    elif kind == DIV:
+        a["dividends"] += amount
+    elif kind == SET:
+        a["lots"] = [[day, shares, amount]] if shares > 0 else []; a["shares"] = shares; a["invested"] = amount
+        a["since"] = day
+    elif kind == CLOSE:
+        events = a["events"]; a.clear(); a.update(_empty()); a["events"] = events; a["since"] = day
+
+def _apply_records(agg: Dict[str, Dict[str, Any]], names: List[str], recs: np.ndarray) -> None:
+    # dividends only add up, so they are summed per ticker in one pass; everything else replays in order
+    # (tickers set or closed within the batch replay entirely, since that moves the date dividends must follow)
+    reset = np.isin(recs["tid"], np.unique(recs["tid"][(recs["kind"] == CLOSE) | (recs["kind"] == SET)]))
+    div = (recs["kind"] == DIV) & ~reset
+    if div.any():
+        tid = recs["tid"][div]; since = np.full(len(names), np.iinfo(np.int64).min, dtype=np.int64)
+        for i in np.unique(tid):
+            at = (agg.get(names[i]) or {}).get("since")
+            if at is not None: since[i] = at
+        counted = recs["day"][div] >= since[tid]   # dated before the opening position: already in it
+        sums = np.bincount(tid[counted], weights=recs["amount"][div][counted], minlength=len(names))
+        counts = np.bincount(tid, minlength=len(names))
+        for i in np.flatnonzero(counts):
+            a = agg.setdefault(names[i], _empty()); a["dividends"] += float(sums[i]); a["events"] += int(counts[i])
+    for r in recs[~div]:
+        _apply_one(agg.setdefault(names[int(r["tid"])], _empty()),
+                   int(r["kind"]), float(r["shares"]), float(r["amount"]), int(r["day"]))
+
+def _pack(tids, kinds, shares, amounts, days) -> np.ndarray:
+    recs = np.zeros(len(tids), dtype=RECORD)
+    recs["tid"] = tids; recs["kind"] = kinds; recs["shares"] = shares; recs["amount"] = amounts; recs["day"] = days
+    return recs
+
+class Ledger:
+    def __init__(self, base_dir: str):
+        self.path = os.path.join(base_dir, "ledger.bin")
+        self.tickers_path = os.path.join(base_dir, "ledger_tickers.json")
+        self.state_path = os.path.join(base_dir, "ledger_state.json")
+        self.keys_path = os.path.join(base_dir, "ledger_keys.npy")
+        self._lock = FileLock(os.path.join(base_dir, "ledger.lock"))   # also held by other processes appending
+        self.tickers: List[str] = []; self._tid: Dict[str, int] = {}
+        self.agg: Dict[str, Dict[str, Any]] = {}; self.count = 0
+        self._load()
+
+    def _load(self) -> None:
+        with self._lock:
+            self._load_tickers()
+            if os.path.exists(self.state_path):
+                with open(self.state_path, "r", encoding="utf-8") as f: state = json.load(f)
+                self.agg = state["agg"]; self.count = state["count"]
+            if self._records_on_disk() < self.count:   # checkpoint ahead of the records file: rebuild from the records
+                self.agg = {}; self.count = 0
+            self.catch_up()
+
+    def _load_tickers(self) -> None:
+        if os.path.exists(self.tickers_path):
+            with open(self.tickers_path, "r", encoding="utf-8") as f: self.tickers = json.load(f)
+            self._tid = {t: i for i, t in enumerate(self.tickers)}
+
+    def _records_on_disk(self) -> int:
+        return os.path.getsize(self.path) // RECORD.itemsize if os.path.exists(self.path) else 0
+
+    def records(self, start: int = 0) -> np.ndarray:
+        n = self._records_on_disk()
+        if n <= start: return np.zeros(0, dtype=RECORD)
+        return np.memmap(self.path, dtype=RECORD, mode="r", offset=start*RECORD.itemsize, shape=(n-start,))
+
+    def catch_up(self) -> int:
+        """Apply records appended since the checkpoint (e.g. by another session). Returns how many."""
+        with self._lock:
+            recs = self.records(self.count)
+            if not len(recs): return 0
+            if int(recs["tid"].max()) >= len(self.tickers): self._load_tickers()
+            self._apply(np.array(recs)); self.count += len(recs); self._save_state()
+            return len(recs)
+
+    def _apply(self, recs: np.ndarray) -> None:
+        _apply_records(self.agg, self.tickers, recs)
+
+    def _save_state(self) -> None:
+        atomic_write(self.state_path, json.dumps({"agg": self.agg, "count": self.count}, separators=(",", ":")).encode("utf-8"))
+
+    def _keys(self) -> np.ndarray:
+        return np.load(self.keys_path) if os.path.exists(self.keys_path) else np.zeros(0, dtype=np.uint64)
+
+    def unseen(self, keys: Iterable[int]) -> np.ndarray:
+        """Mask of the entries not appended before under the same key; a key given n times stands for n entries."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        with self._lock: seen = self._keys()
+        order = np.argsort(keys, kind="stable"); ks = keys[order]
+        first = np.flatnonzero(np.r_[True, ks[1:] != ks[:-1]]) if len(ks) else np.zeros(0, dtype=int)
+        nth = np.arange(len(ks)) - np.repeat(first, np.diff(np.r_[first, len(ks)]))
+        out = np.empty(len(keys), dtype=bool)
+        out[order] = nth >= np.searchsorted(seen, ks, "right") - np.searchsorted(seen, ks, "left")
+        return out
+
+    def append(self, tickers: Iterable[str], kinds: Iterable[int], shares: Iterable[float],
+               amounts: Iterable[float], days: Iterable[int], keys: Optional[Iterable[int]] = None) -> int:
+        """Append entries (parallel sequences) and advance the aggregates by just those entries.
+
+        With `keys` (one per entry), entries already appended under the same key are left out.
+        """
+        tickers = list(tickers)
+        if not tickers: return 0
+        with self._lock:
+            self.catch_up()
+            if keys is not None:
+                keys = np.asarray(keys, dtype=np.uint64); keep = self.unseen(keys); keys = keys[keep]
+                tickers = [t for t, k in zip(tickers, keep) if k]
+                kinds, shares, amounts, days = (np.asarray(list(v))[keep] for v in (kinds, shares, amounts, days))
+                if not tickers: return 0
+            new = [t for t in dict.fromkeys(tickers) if t not in self._tid]
+            if new:   # another process may have added tickers since we last read the list
+                self._load_tickers(); new = [t for t in dict.fromkeys(tickers) if t not in self._tid]
+            if new:   # ticker ids must be on disk before any record that uses them
+                for t in new: self._tid[t] = len(self.tickers); self.tickers.append(t)
+                atomic_write(self.tickers_path, json.dumps(self.tickers).encode("utf-8"))
+            recs = _pack([self._tid[t] for t in tickers], list(kinds), list(shares), list(amounts), list(days))
+            with open(self.path, "ab") as f:
+                f.write(recs.tobytes()); f.flush(); os.fsync(f.fileno())
+            if keys is not None:
+                buf = io.BytesIO(); np.save(buf, np.sort(np.concatenate([self._keys(), keys])))
+                atomic_write(self.keys_path, buf.getvalue())
+            self._apply(recs); self.count += len(recs); self._save_state()
+            return len(recs)
+
+    def preview(self, tickers: Iterable[str], kinds: Iterable[int], shares: Iterable[float],
+                amounts: Iterable[float], days: Iterable[int]) -> Dict[str, Dict[str, Any]]:
+        """Aggregates the affected tickers would have after append() with the same arguments; nothing is written."""
+        tickers = list(tickers); names = list(dict.fromkeys(tickers)); tid = {t: i for i, t in enumerate(names)}
+        recs = _pack([tid[t] for t in tickers], list(kinds), list(shares), list(amounts), list(days))
+        with self._lock:
+            self.catch_up()
+            agg = {t: copy.deepcopy(self.agg[t]) if t in self.agg else _empty() for t in names}
+        _apply_records(agg, names, recs)
+        return agg
+
+    def record(self, ticker: str, kind: int, shares: float = 0.0, amount: float = 0.0, when=None) -> None:
+        self.append([ticker], [kind], [shares], [amount], [to_day(when or date.today())])
+
+    def position(self, ticker: str) -> Dict[str, Any]:
+        a = self.agg.get(ticker) or _empty()
+        true_ada = (a["invested"] - a["dividends"]) / a["shares"] if a["shares"] > EPS else float("nan")
+        return {**a, "true_ada": true_ada}
+
+    def history(self, ticker: str, kind: Optional[int] = None) -> pd.DataFrame:
+        """All entries for one ticker, newest first."""
+        tid = self._tid.get(ticker)
+        recs = self.records()
+        if tid is None or not len(recs): return pd.DataFrame(columns=["Date", "Type", "Shares", "Amount"])
+        mask = recs["tid"] == tid
+        if kind is not None: mask &= recs["kind"] == kind
+        sub = np.array(recs[mask])
+        sub = sub[np.lexsort((np.arange(len(sub)), sub["day"]))[::-1]]
+        return pd.DataFrame({"Date": pd.to_datetime(sub["day"], unit="D").date,
+                             "Type": [KINDS.get(int(k), "?") for k in sub["kind"]],
+                             "Shares": sub["shares"], "Amount": sub["amount"]})
+
+    def sync(self, holdings: Dict[str, Dict[str, Any]], tickers: Optional[Iterable[str]] = None) -> None:
+        """Copy ledger aggregates into the holdings' scalar fields."""
+        for t in (tickers if tickers is not None else holdings):
+            if t not in holdings or t not in self.agg: continue
+            a = self.agg[t]; rec = holdings[t]
+            rec["shares"] = round(a["shares"], 6); rec["total_invested"] = round(a["invested"], 2)
+            rec["dividends_collected"] = round(a["dividends"], 2)
+
+    def reconcile(self, holdings: Dict[str, Dict[str, Any]], tickers: Optional[Iterable[str]] = None, when=None) -> int:
+        """Append corrections so the ledger agrees with holdings edited outside it (manual edits, merges, restores).
+
+        Only `tickers` are checked when given; otherwise every holding, and open ledger positions
+        with no holding are closed.
+        """
+        day = to_day(when or date.today()); out = ([], [], [], [], [])
+        def add(t, k, s, a): out[0].append(t); out[1].append(k); out[2].append(s); out[3].append(a); out[4].append(day)
+        check = list(holdings) if tickers is None else list(tickers)
+        with self._lock:   # corrections are deltas: compute them against the latest records
+            self.catch_up()
+            for t in check:
+                if t not in holdings:
+                    if t in self.agg: add(t, CLOSE, 0.0, 0.0)
+                    continue
+                rec = holdings[t]; a = self.agg.get(t) or _empty()
+                shares = float(rec.get("shares", 0) or 0); invested = float(rec.get("total_invested", 0) or 0)
+                divs = float(rec.get("dividends_collected", 0) or 0)
+                if abs(a["shares"] - shares) > 1e-6 or abs(a["invested"] - invested) > 0.005: add(t, SET, shares, invested)
+                if abs(a["dividends"] - divs) > 0.005: add(t, DIV, 0.0, divs - a["dividends"])
+            if tickers is None:
+                for t, a in self.agg.items():
+                    if t not in holdings and (a["shares"] > EPS or abs(a["dividends"]) > 0.005): add(t, CLOSE, 0.0, 0.0)
+            return self.append(*out)
@@ -0,0 +1,85 @@
+# MKK Investment Tracker — persistent market-data cache
+# - SQLite file next to portfolio_data.json, survives restarts/redeploys
+# - Separate TTL per data class; stale values are served right away and refreshed in the background
+# - Hit / stale / miss counts and served ages for diagnostics
+
+import json, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+TTL = {"quote": 15*60, "dividends": 3*86400, "meta": 4*7*86400}   # seconds
+FAIL_TTL = 10*60   # don't retry a failed lookup for this long (kept in memory only)
+
+class MarketCache:
+    def __init__(self, path: str, ttl: Optional[Dict[str, float]] = None):
+        self.path = path; self.ttl = {**TTL, **(ttl or {})}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (kind TEXT, key TEXT, value TEXT, fetched REAL, PRIMARY KEY (kind, key))")
+        self._failed: Dict[tuple, float] = {}
+        self._refreshing: set = set()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mkk-refresh")
+        self._stats = {k: {"hit": 0, "stale": 0, "miss": 0, "age_sum": 0.0, "age_max": 0.0} for k in self.ttl}
+
+    def rows(self, kind: str, keys: List[str]) -> Dict[str, tuple]:
+        """{key: (value, fetched at)} for the keys the cache holds, whatever their age."""
+        out = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i+500]
+                q = f"SELECT key, value, fetched FROM cache WHERE kind=? AND key IN ({','.join('?'*len(chunk))})"
+                for key, value, fetched in self._db.execute(q, [kind, *chunk]): out[key] = (json.loads(value), fetched)
+        return out
+
+    def read(self, kind: str, keys: Iterable[str], refresh: Optional[Callable[[List[str]], Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Cached values for keys, fresh or stale. Stale keys are passed to refresh(keys) in the background."""
+        keys = list(dict.fromkeys(keys)); now = time.time()
+        rows = self.rows(kind, keys); s = self._stats[kind]; stale = []
+        for key in keys:
+            if key not in rows: s["miss"] += 1; continue
+            age = now - rows[key][1]
+            s["age_sum"] += age; s["age_max"] = max(s["age_max"], age)
+            if age > self.ttl[kind]: s["stale"] += 1; stale.append(key)
+            else: s["hit"] += 1
+        if stale and refresh is not None: self.refresh_later(kind, stale, refresh)
+        return {k: v for k, (v, _) in rows.items()}
+
+    def missing(self, kind: str, keys: Iterable[str], cached: Dict[str, Any]) -> List[str]:
+        """Keys with no cached value that haven't failed recently."""
+        now = time.time()
+        return [k for k in keys if k not in cached and now - self._failed.get((kind, k), 0) > FAIL_TTL]
+
+    def write(self, kind: str, values: Dict[str, Any]) -> None:
+        if not values: return
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO cache (kind, key, value, fetched) VALUES (?,?,?,?)",
+                                 [(kind, k, json.dumps(v), now) for k, v in values.items()])
+        for k in values: self._failed.pop((kind, k), None)
+
+    def fail(self, kind: str, keys: Iterable[str]) -> None:
+        now = time.time()
+        for k in keys: self._failed[(kind, k)] = now
+
+    def refresh_later(self, kind: str, keys: List[str], refresh: Callable[[List[str]], Dict[str, Any]]) -> None:
+        with self._lock:
+            keys = [k for k in keys if (kind, k) not in self._refreshing]
+            self._refreshing.update((kind, k) for k in keys)
+        if not keys: return
+        def run():
+            try: self.write(kind, refresh(keys) or {})
+            except Exception: pass
+            finally:
+                with self._lock: self._refreshing.difference_update((kind, k) for k in keys)
+        self._pool.submit(run)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for kind, s in self._stats.items():
+            served = s["hit"] + s["stale"]; total = served + s["miss"]
+            out[kind] = {"hit": s["hit"], "stale": s["stale"], "miss": s["miss"],
+                         "hit_rate": (served/total) if total else float("nan"),
+                         "avg_age_s": (s["age_sum"]/served) if served else float("nan"), "max_age_s": s["age_max"]}
+        return out
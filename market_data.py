@@ -0,0 +1,141 @@
+# MKK Investment Tracker — market data
+# - Batched quotes: one bulk yf.download per chunk of tickers, per-ticker history() fallback
+# - Daily close bars for a date range, batched like quotes
+# - Concurrent pool for per-ticker .info / .dividends lookups (bounded, per-request timeout, retry + backoff)
+# - yfinance is imported on the first request, not with this module: it is the slowest import and most
+#   reruns are served from the caches without it
+# - No Streamlit here; tracker_app.py wraps these with its caches
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import pandas as pd, numpy as np
+import perf
+
+CHUNK_SIZE = 100
+MAX_WORKERS = 8
+TIMEOUT = 20.0   # seconds per attempt
+RETRIES = 2
+BACKOFF = 0.5    # seconds, doubled per retry
+
+def _yf():
+    with perf.boot_step("import yfinance"): import yfinance
+    return yfinance
+
+def _last_close(hist) -> float:
+    if hist is None or hist.empty or "Close" not in hist: return float("nan")
+    closes = hist["Close"].dropna()
+    return float(closes.iloc[-1]) if len(closes) else float("nan")
+
+def fetch_price(ticker: str) -> float:
+    perf.count("yf.history")
+    try: return _last_close(_yf().Ticker(ticker).history(period="5d", interval="1d"))
+    except Exception: return float("nan")
+
+def _download_chunk(tickers: List[str]) -> Dict[str, float]:
+    perf.count("yf.download")
+    try:
+        df = _yf().download(tickers, period="5d", interval="1d", group_by="ticker",
+                         auto_adjust=True, threads=True, progress=False)
+    except Exception: return {}
+    if df is None or df.empty: return {}
+    out = {}
+    for t in tickers:
+        if isinstance(df.columns, pd.MultiIndex):
+            if t not in df.columns.get_level_values(0): continue
+            sub = df[t]
+        else: sub = df
+        p = _last_close(sub)
+        if np.isfinite(p): out[t] = p
+    return out
+
+def fetch_prices(tickers: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Tuple[Dict[str, float], List[str]]:
+    """Latest close for every ticker. Returns (prices, failed tickers)."""
+    tickers = sorted({t for t in tickers if t})
+    prices: Dict[str, float] = {}
+    for i in range(0, len(tickers), chunk_size):
+        prices.update(_download_chunk(tickers[i:i+chunk_size]))
+    failed = []
+    for t in tickers:
+        if t in prices: continue
+        p = fetch_price(t)
+        if np.isfinite(p): prices[t] = p
+        else: failed.append(t)
+    return prices, failed
+
+def fetch_daily_closes(tickers: Iterable[str], start: str, end: str, chunk_size: int = CHUNK_SIZE) -> Dict[str, pd.Series]:
+    """Unadjusted daily closes in [start, end) per ticker; tickers with no data are left out."""
+    tickers = sorted({t for t in tickers if t}); out: Dict[str, pd.Series] = {}
+    for i in range(0, len(tickers), chunk_size):
+        chunk = tickers[i:i+chunk_size]
+        perf.count("yf.download")
+        try:
+            df = _yf().download(chunk, start=start, end=end, interval="1d", group_by="ticker",
+                             auto_adjust=False, threads=True, progress=False)
+        except Exception: continue
+        if df is None or df.empty: continue
+        for t in chunk:
+            if isinstance(df.columns, pd.MultiIndex):
+                if t not in df.columns.get_level_values(0): continue
+                sub = df[t]
+            else: sub = df
+            if "Close" not in sub: continue
+            closes = sub["Close"].dropna()
+            if len(closes): out[t] = closes
+    return out
+
+def fetch_name_and_summary(ticker: str) -> Tuple[str, str]:
+    perf.count("yf.info")
+    info = _yf().Ticker(ticker).info or {}
+    name = info.get("longName") or info.get("shortName") or info.get("symbol") or ticker
+    summary = info.get("longBusinessSummary") or info.get("description") or ""
+    if summary: summary = (summary[:500]+"…") if len(summary) > 500 else summary
+    return name, summary
+
+def fetch_dividends(ticker: str) -> List[list]:
+    """Full dividend history as [[YYYY-MM-DD, amount], ...], oldest first."""
+    perf.count("yf.dividends")
+    div = _yf().Ticker(ticker).dividends
+    if div is None or len(div) == 0: return []
+    idx = pd.to_datetime(div.index)
+    return [[d.strftime("%Y-%m-%d"), float(a)] for d, a in zip(idx, div.values)]
+
+def fetch_concurrent(fn: Callable[[str], Any], tickers: Iterable[str], max_workers: int = MAX_WORKERS,
+                     timeout: float = TIMEOUT, retries: int = RETRIES,
+                     backoff: float = BACKOFF) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+    """Run fn(ticker) on a bounded thread pool and yield (ticker, result, error) as each one finishes.
+
+    Failed attempts are retried with exponential backoff; an attempt running longer than
+    `timeout` is given up on and reported as a TimeoutError.
+    """
+    tickers = list(dict.fromkeys(t for t in tickers if t))
+    if not tickers: return
+    started: Dict[str, float] = {}
+    owner = perf.current()   # requests made by the workers count towards the caller's rerun
+
+    def run(t: str):
+        with perf.attach(owner):
+            for attempt in range(retries+1):
+                started[t] = time.monotonic()
+                try: return fn(t)
+                except Exception:
+                    if attempt == retries: raise
+                    started.pop(t, None)
+                    time.sleep(backoff * 2**attempt)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="mkk-fetch")
+    try:
+        pending = {pool.submit(run, t): t for t in tickers}
+        while pending:
+            done, _ = wait(pending, timeout=min(1.0, timeout), return_when=FIRST_COMPLETED)
+            for fut in done:
+                t = pending.pop(fut)
+                err = fut.exception()
+                yield t, (None if err else fut.result()), err
+            now = time.monotonic()
+            for fut, t in list(pending.items()):
+                if t in started and now - started[t] > timeout:
+                    del pending[fut]; fut.cancel()
+                    yield t, None, TimeoutError(f"{t}: no response after {timeout:.0f}s")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,14 @@
 import streamlit as st
 st.title("Environment Check")
-import sys, platform
+import sys, platform, time
 st.write("Python:", sys.version)
 st.write("Platform:", platform.platform())
 
 ok, errs = {}, {}
 for name in ["yfinance","pandas","numpy","requests"]:
     try:
-        mod = __import__(name)
-        ok[name] = getattr(mod, "__version__", "OK")
+        t = time.perf_counter(); mod = __import__(name)
+        ok[name] = f"{getattr(mod, '__version__', 'OK')} ({(time.perf_counter()-t)*1000:,.0f} ms)"
     except Exception as e:
         errs[name] = str(e)
 
@@ -0,0 +1,105 @@
+# MKK Investment Tracker — runtime instrumentation
+# - Process-wide counters (e.g. yfinance requests) that any thread can bump
+# - Per-rerun section timings and counts; a count is also tallied on the run of the thread making it
+#   (worker threads join a run through attach()), cache deltas are taken between start() and finish()
+# - Optional JSON-lines log for offline comparison
+# - Process startup: how long each heavy import took and when the first run reached each stage
+
+import functools, json, threading, time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_local = threading.local()
+_T_START = time.perf_counter()   # imported first thing by the app, so roughly when the process began loading it
+_boot_steps: Dict[str, float] = {}
+_boot_marks: Dict[str, float] = {}
+
+def count(name: str, n: int = 1) -> None:
+    run = current()
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+        if run is not None: run.counts[name] = run.counts.get(name, 0) + n
+
+def counters() -> Dict[str, int]:
+    with _lock: return dict(_counters)
+
+class RunStats:
+    def __init__(self, cache_stats: Optional[Callable[[], Dict[str, Dict[str, float]]]] = None):
+        self.cache_stats = cache_stats
+        self.sections: Dict[str, list] = {}   # name -> [seconds, calls]
+        self.t0 = time.perf_counter(); self.wall = 0.0
+        self._k0 = cache_stats() if cache_stats else {}
+        self.counts: Dict[str, int] = {}; self.cache: Dict[str, Dict[str, int]] = {}   # counts: only this run's threads
+
+    def watch_cache(self, cache_stats: Callable[[], Dict[str, Dict[str, float]]]) -> None:
+        """Report cache hit/stale/miss deltas from now until finish()."""
+        self.cache_stats = cache_stats; self._k0 = cache_stats()
+
+    @contextmanager
+    def time(self, name: str):
+        t = time.perf_counter()
+        try: yield
+        finally:
+            sec = self.sections.setdefault(name, [0.0, 0]); sec[0] += time.perf_counter() - t; sec[1] += 1
+
+    def finish(self) -> "RunStats":
+        self.wall = time.perf_counter() - self.t0
+        if self.cache_stats:
+            k1 = self.cache_stats()
+            self.cache = {kind: {f: int(s[f] - self._k0.get(kind, {}).get(f, 0)) for f in ("hit", "stale", "miss")} for kind, s in k1.items()}
+        return self
+
+    def record(self) -> Dict[str, Any]:
+        return {"ts": datetime.now().isoformat(timespec="seconds"), "wall_ms": round(self.wall*1000, 1),
+                "sections": {k: {"ms": round(v[0]*1000, 1), "calls": v[1]} for k, v in self.sections.items()},
+                "counts": self.counts, "cache": self.cache}
+
+    def write_jsonl(self, path: str, **extra) -> None:
+        with open(path, "a", encoding="utf-8") as f: f.write(json.dumps({**self.record(), **extra}) + "\n")
+
+@contextmanager
+def boot_step(name: str):
+    """Time a one-off startup step such as an import; only the first (cold) time is kept."""
+    t = time.perf_counter()
+    try: yield
+    finally:
+        with _lock: _boot_steps.setdefault(name, time.perf_counter() - t)
+
+def boot_mark(name: str) -> None:
+    """Seconds from process start until `name` was first reached."""
+    with _lock: _boot_marks.setdefault(name, time.perf_counter() - _T_START)
+
+def boot_timings() -> Dict[str, Dict[str, float]]:
+    with _lock: return {"steps": dict(_boot_steps), "marks": dict(_boot_marks)}
+
+def start(cache_stats=None) -> RunStats:
+    """Begin a rerun's stats on this thread; timed() sections record into it."""
+    _local.run = RunStats(cache_stats); return _local.run
+
+def current() -> Optional[RunStats]:
+    return getattr(_local, "run", None)
+
+@contextmanager
+def attach(run: Optional[RunStats]):
+    """Count this thread's work towards `run` (a worker doing a rerun's fetches), then restore."""
+    prev = current(); _local.run = run
+    try: yield
+    finally: _local.run = prev
+
+@contextmanager
+def section(name: str):
+    run = current()
+    if run is None: yield
+    else:
+        with run.time(name): yield
+
+def timed(name: str):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            with section(name): return fn(*a, **kw)
+        return wrapper
+    return deco
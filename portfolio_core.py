@@ -0,0 +1,81 @@
+# MKK Investment Tracker — portfolio computation core
+# - Holdings loaded into one columnar DataFrame per rerun; all derived columns computed vectorized
+# - Money columns are converted from each holding's currency to the display currency in one pass (fx.py)
+# - Shared by the Portfolio and True ADA tabs and the metric cards
+# - Merge of holdings from another portfolio_data.json (Migration tab)
+
+from typing import Any, Dict, Optional, Tuple
+import pandas as pd, numpy as np
+import fx
+
+MONEY_COLUMNS = ["Purchase Price", "Total Invested", "Price Now", "Current Value", "Dividends Collected", "True ADA", "Overall Return $"]
+
+def _num(df: pd.DataFrame, col: str, default: float = 0.0) -> np.ndarray:
+    if col not in df: return np.full(len(df), default, dtype=float)
+    return pd.to_numeric(df[col], errors="coerce").fillna(default).to_numpy(dtype=float)
+
+def holdings_frame(holdings: Dict[str, Dict[str, Any]], prices: Dict[str, float], currency: str = "USD",
+                   rates: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """One row per holding, sorted by ticker, with market value, returns and True ADA columns.
+
+    Amounts are in each holding's currency (its Currency column); quotes are in the ticker's listing currency.
+    With `rates` (USD per unit, fx.usd_rates) a quote is first brought into the holding's currency where the two
+    differ, then the money columns are converted to `currency`, NaN where a rate is missing. FX is the factor used
+    for the holding's amounts, Quote FX the one taking a raw quote (e.g. a per-share dividend) to `currency`.
+    """
+    raw = pd.DataFrame.from_dict(holdings, orient="index").sort_index() if holdings else pd.DataFrame()
+    tickers = raw.index.to_numpy(dtype=object) if len(raw) else np.array([], dtype=object)
+    shares = _num(raw, "shares"); invested = _num(raw, "total_invested"); divs = _num(raw, "dividends_collected")
+    purchase = _num(raw, "purchase_price", np.nan)
+    price = pd.Series(prices, dtype=float).reindex(tickers).to_numpy(dtype=float) * fx.quote_scale(tickers) if len(tickers) else np.array([], dtype=float)
+    ccy = fx.holding_currencies(raw, tickers); listing = fx.listing_currency(tickers)
+    other = listing != ccy
+    if rates is not None and other.any():   # holding's currency set to something other than where it's listed
+        with np.errstate(invalid="ignore"):
+            price = np.where(other, price * fx.factors(listing, "USD", rates) / fx.factors(ccy, "USD", rates), price)
+    names = raw["name"].fillna("").to_numpy(dtype=object) if "name" in raw else np.full(len(raw), "", dtype=object)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = shares * price
+        overall = np.where(np.isfinite(value), value - invested, 0.0) + divs
+        ret_pct = np.where(invested > 0, overall / invested * 100.0, np.nan)
+        true_ada = np.where(shares > 0, (invested - divs) / shares, np.nan)
+        ok = (shares > 0) & np.isfinite(price) & np.isfinite(true_ada) & (true_ada != 0)
+        vs_true = np.where(ok, (price - true_ada) / true_ada * 100.0, np.nan)
+
+    df = pd.DataFrame({
+        "Ticker": tickers, "Name": names, "Currency": ccy, "Shares": np.round(shares, 6), "Purchase Price": purchase,
+        "Total Invested": invested, "Price Now": price, "Current Value": value,
+        "Dividends Collected": divs, "True ADA": true_ada,
+        "Overall Return $": np.where(np.isfinite(overall), overall, np.nan),
+        "Overall Return %": np.where(np.isfinite(ret_pct), ret_pct, np.nan),
+        "Return vs True ADA %": vs_true,
+        "FX": fx.factors(ccy, currency, rates) if rates is not None else np.ones(len(tickers)),
+        "Quote FX": fx.quote_scale(tickers) * (fx.factors(listing, currency, rates) if rates is not None else 1.0),
+    })
+    return fx.convert(df, MONEY_COLUMNS, df["FX"].to_numpy()) if rates is not None else df
+
+def portfolio_totals(df: pd.DataFrame, cash: float = 0.0) -> Dict[str, float]:
+    """Portfolio-level sums and ratios used by the metric cards."""
+    invested = float(df["Total Invested"].sum()); divs = float(df["Dividends Collected"].sum())
+    value = float(np.nansum(df["Current Value"].to_numpy(dtype=float)))
+    shares = float(df["Shares"].sum())
+    overall = (value - invested) + divs
+    if shares > 0:
+        avg_cost = invested / shares; true_ada = (invested - divs) / shares
+        improvement = ((avg_cost - true_ada) / avg_cost * 100.0) if avg_cost > 0 else np.nan
+    else: avg_cost = true_ada = improvement = np.nan
+    return {"total_invested": invested, "total_value": value, "total_div": divs, "cash": float(cash),
+            "total_value_incl_cash": value + float(cash), "overall": overall,
+            "overall_pct": (overall / invested * 100.0) if invested > 0 else np.nan,
+            "sum_shares": shares, "avg_cost": avg_cost, "true_ada": true_ada, "improvement_pct": improvement}
+
+def merge_holdings(holdings: Dict[str, Dict[str, Any]], incoming: Dict[str, Dict[str, Any]], overwrite: bool = False) -> Tuple[int, int]:
+    """Merge another file's holdings in place. Returns (added, updated)."""
+    added = updated = 0
+    for tkr, rec in incoming.items():
+        rec.setdefault("last_div_amount", 0.0)
+        rec.setdefault("last_div_date", "")
+        if tkr not in holdings: holdings[tkr] = rec; added += 1
+        elif overwrite: holdings[tkr] = rec; updated += 1
+    return added, updated
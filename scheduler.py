@@ -0,0 +1,138 @@
+# MKK Investment Tracker — background price refresh
+# - One worker thread per process refreshes quotes for every ticker any open session watches, as one batch
+# - Interval follows the US market clock: short while open, longer around it, rare overnight and at weekends
+# - Quotes (with their fetch time) go to the shared market cache; watchers persist their own tickers' prices
+# - No Streamlit here; tracker_app.py owns the instance and polls version() to pick up new quotes
+
+import threading, time
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from market_cache import MarketCache
+
+try:
+    from zoneinfo import ZoneInfo
+    _NY = ZoneInfo("America/New_York")
+except Exception: _NY = timezone(timedelta(hours=-5))   # no tz database: Eastern Standard Time all year
+
+INTERVAL = {"open": 60, "extended": 15*60, "closed": 60*60}   # seconds between refreshes per market phase
+MAX_BACKOFF = 8        # refreshes that fetch nothing stretch the interval, up to this factor
+WATCH_TTL = 10*60      # a watcher not renewed for this long (no session showing its prices) is dropped
+PERSIST_EVERY = 15*60  # watchers' prices are written to their data files at most this often, and at phase changes
+COALESCE_S = 1.0       # requests arriving this close together go out in one batch
+
+Quote = Tuple[float, float]   # (price, fetched at, epoch seconds)
+Persist = Callable[[Dict[str, Quote]], object]
+
+def market_phase(now: Optional[datetime] = None) -> str:
+    """'open' (regular session), 'extended' (pre/after hours) or 'closed', on the NYSE clock; holidays count as open."""
+    t = (now or datetime.now(timezone.utc)).astimezone(_NY)
+    if t.weekday() >= 5: return "closed"
+    if dtime(9, 30) <= t.time() < dtime(16, 0): return "open"
+    if dtime(4, 0) <= t.time() < dtime(20, 0): return "extended"
+    return "closed"
+
+class PriceScheduler:
+    """Keeps quotes for the union of watched tickers fresh from a daemon thread.
+
+    watch() is called on every rerun that shows prices; request() asks for tickers now. Both return at once:
+    the fetch happens on the worker, and version(key) goes up when a watcher's tickers got new quotes.
+    """
+    def __init__(self, cache: MarketCache, fetch: Callable[[List[str]], Tuple[Dict[str, float], List[str]]],
+                 interval: Optional[Dict[str, float]] = None):
+        self.cache = cache; self.fetch = fetch; self.interval = {**INTERVAL, **(interval or {})}
+        self.quotes: Dict[str, Quote] = {}
+        self.last_run = 0.0; self.next_run = 0.0; self.failures = 0; self.phase = market_phase()
+        self._watchers: Dict[str, dict] = {}   # key -> tickers, seen, persist, persisted, version
+        self._urgent: Set[str] = set(); self._once: List[Tuple[str, Set[str], Persist]] = []
+        self._lock = threading.Lock(); self._wake = threading.Event(); self._thread: Optional[threading.Thread] = None
+
+    def watch(self, key: str, tickers: Iterable[str], persist: Optional[Persist] = None) -> None:
+        """Keep `tickers` fresh for `key` (a portfolio) until it isn't renewed for WATCH_TTL."""
+        tickers = set(tickers)
+        unknown = [t for t in tickers if t not in self.quotes]
+        if unknown:   # seed from the cache so a restart doesn't refetch everything
+            for t, (p, fetched) in self.cache.rows("quote", unknown).items(): self.quotes.setdefault(t, (float(p), fetched))
+        due = time.time() - self.interval[self.phase]
+        stale = [t for t in tickers if self.quotes.get(t, (0, 0))[1] < due]
+        with self._lock:
+            w = self._watchers.setdefault(key, {"persisted": time.time(), "version": 0})
+            w.update(tickers=tickers, seen=time.time(), persist=persist)
+            self._urgent.update(self.cache.missing("quote", stale, {}))
+            self._start()
+        if self._urgent: self._wake.set()
+
+    def request(self, key: str, tickers: Iterable[str], persist: Optional[Persist] = None) -> None:
+        """Fetch `tickers` now, whatever their age; `persist` gets the result once it's in."""
+        tickers = set(tickers)
+        with self._lock:
+            self._urgent.update(tickers)
+            if persist is not None: self._once.append((key, tickers, persist))
+            self._watchers.setdefault(key, {"tickers": set(), "seen": time.time(), "persist": None,
+                                            "persisted": time.time(), "version": 0})
+            self._start()
+        self._wake.set()
+
+    def prices(self, tickers: Iterable[str]) -> Dict[str, Quote]:
+        quotes = self.quotes
+        return {t: quotes[t] for t in tickers if t in quotes}
+
+    def version(self, key: str) -> int:
+        w = self._watchers.get(key)
+        return w["version"] if w else 0
+
+    def status(self) -> Dict[str, object]:
+        with self._lock: n = len(set().union(*(w["tickers"] for w in self._watchers.values()))) if self._watchers else 0
+        return {"phase": self.phase, "last_run": self.last_run, "next_run": self.next_run, "tickers": n,
+                "pending": len(self._urgent), "failures": self.failures, "running": self._thread is not None}
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mkk-prices", daemon=True); self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                now = time.time()
+                for k in [k for k, w in self._watchers.items() if now - w["seen"] > WATCH_TTL]:
+                    del self._watchers[k]
+                if not self._watchers: self._thread = None; return
+                due = now >= self.next_run; urgent = bool(self._urgent)
+            if not (due or urgent):
+                self._wake.wait(min(self.next_run - now, 60)); self._wake.clear(); continue
+            if not due: time.sleep(COALESCE_S)   # let concurrent requests from other sessions join this batch
+            self._wake.clear()
+            with self._lock:
+                batch = set(self._urgent); self._urgent.clear()
+                if due: batch.update(*(w["tickers"] for w in self._watchers.values()))
+                once, self._once = self._once, []
+            self._refresh(sorted(batch), due, once)
+
+    def _refresh(self, batch: List[str], scheduled: bool, once: List[Tuple[str, Set[str], Persist]]) -> None:
+        try: fresh, failed = self.fetch(batch) if batch else ({}, [])
+        except Exception: fresh, failed = {}, list(batch)
+        now = time.time(); phase = market_phase()
+        self.cache.write("quote", fresh); self.cache.fail("quote", failed)
+        self.quotes.update({t: (float(p), now) for t, p in fresh.items()})
+        if scheduled:
+            self.failures = self.failures + 1 if batch and not fresh else 0
+            self.next_run = now + self.interval[phase] * min(2 ** self.failures, MAX_BACKOFF)
+        self.last_run = now; changed_phase = phase != self.phase; self.phase = phase
+        got = set(fresh)
+        for key, tickers, persist in once:
+            self._persist(persist, {t: self.quotes[t] for t in tickers if t in self.quotes})
+            if key in self._watchers: self._watchers[key]["persisted"] = now
+        with self._lock: watchers = list(self._watchers.values())
+        for w in watchers:
+            if not got & w["tickers"]: continue
+            if w["persist"] is not None and (changed_phase or now - w["persisted"] >= PERSIST_EVERY):
+                self._persist(w["persist"], self.prices(w["tickers"])); w["persisted"] = now
+            w["version"] += 1
+        for key, tickers, _ in once:
+            w = self._watchers.get(key)
+            if w is not None and not got & w["tickers"] and got & tickers: w["version"] += 1
+
+    @staticmethod
+    def _persist(persist: Persist, quotes: Dict[str, Quote]) -> None:
+        if not quotes: return
+        try: persist(quotes)
+        except Exception: pass   # the next persist carries the same prices
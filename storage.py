@@ -0,0 +1,326 @@
+# MKK Investment Tracker — portfolio storage
+# - portfolio_data.json is the snapshot; changes since then go to an append-only journal next to it
+# - save() appends only the rows that changed; concurrent sessions are merged row by row (holdings, top-level keys)
+#   and files are locked across processes, so one portfolio can be open in many sessions
+# - Snapshot writes are atomic (temp file + os.replace); the journal is folded back in when it has many records
+#   or outgrows the snapshot (price updates journal whole dicts), so a reload never replays more than that
+# - The parsed model is kept per store and reused while the files' mtime/size are unchanged; large snapshots
+#   also get a pickled copy (<stem>.snap) and orjson is used for parsing when installed
+# - Files from older versions are migrated once on load and written back
+# - Prices from the background refresher are recorded with a fetch time per ticker (price_updated)
+# - Named portfolios live in portfolios/<name>/ under the data directory; the original one stays at its top
+
+import json, os, pickle, re, tempfile, threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+try: import orjson
+except ImportError: orjson = None
+try: import fcntl
+except ImportError: fcntl = None   # no flock (Windows): threads are still serialized, processes are not
+
+COMPACT_RECORDS = 500   # fold the journal into the snapshot after this many records…
+COMPACT_BYTES = 4 << 20 # …or once it is bigger than the snapshot and at least this big
+LOG_ROWS = 20000        # row changes remembered for telling a session's own edits from others'
+BINARY_MIN_BYTES = 1 << 20   # snapshots at least this big get a pickled copy next to them
+VERSION = "1.9.0"
+DATA_NAME = "portfolio_data.json"
+DEFAULT_PORTFOLIO = "Main"
+_PORTFOLIO_NAME = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9 _.-]{0,63}$")
+
+def _dumps(v: Any) -> str:
+    return json.dumps(v, separators=(",", ":"), sort_keys=True)
+
+def _loads(raw: bytes) -> Any:
+    if orjson is not None:
+        try: return orjson.loads(raw)
+        except orjson.JSONDecodeError: pass   # e.g. NaN written by json.dumps; let json have a go
+    return json.loads(raw)
+
+_CONTAINERS = (dict, list)
+
+def _clone(v: Any) -> Any:
+    """Copy of a JSON-shaped value; much cheaper than copy.deepcopy."""
+    if type(v) is dict: return {k: _clone(x) if type(x) in _CONTAINERS else x for k, x in v.items()}
+    if type(v) is list: return [_clone(x) if type(x) in _CONTAINERS else x for x in v]
+    return v
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try: st = os.stat(path)
+    except OSError: return None
+    return st.st_mtime_ns, st.st_size
+
+def atomic_write(path: str, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data); f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+def new_portfolio() -> Dict[str, Any]:
+    return {"holdings": {}, "cash_uninvested": 0.0,
+            "settings": {"currency":"USD","auto_price": True, "fetch_workers": 8},
+            "last_prices": {}, "last_updated": None, "price_updated": {}, "version": VERSION}
+
+def needs_migration(d: Dict[str, Any]) -> bool:
+    """True unless `d` is at VERSION and has every top-level field and setting migrate() fills in."""
+    settings = d.get("settings")
+    return (d.get("version") != VERSION or not isinstance(settings, dict)
+            or any(k not in d for k in ("holdings", "cash_uninvested", "last_prices", "last_updated", "price_updated"))
+            or any(k not in settings for k in ("currency", "auto_price", "fetch_workers")))
+
+def migrate(d: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in fields added since older versions of portfolio_data.json (in place)."""
+    d.setdefault("holdings", {}); d.setdefault("settings", {})
+    d["settings"].setdefault("currency","USD")
+    d["settings"].setdefault("auto_price", True)
+    d["settings"].setdefault("fetch_workers", 8)
+    d.setdefault("last_prices", {}); d.setdefault("last_updated", None); d.setdefault("price_updated", {})
+    d.setdefault("cash_uninvested", 0.0); d["version"]=VERSION
+    for rec in d.get("holdings", {}).values():
+        rec.setdefault("purchase_price", None)
+        rec.setdefault("dividends_collected", 0.0)
+        rec.setdefault("last_div_amount", 0.0)
+        rec.setdefault("last_div_date", "")
+        rec.setdefault("summary","")
+    return d
+
+def valid_portfolio_name(name: str) -> bool:
+    return bool(_PORTFOLIO_NAME.match(name)) and name.lower() != DEFAULT_PORTFOLIO.lower()
+
+def portfolio_file(base_dir: str, name: str) -> str:
+    """Data file of a named portfolio (its ledger and journal sit next to it)."""
+    if name == DEFAULT_PORTFOLIO: return os.path.join(base_dir, DATA_NAME)
+    if not valid_portfolio_name(name): raise ValueError(f"Invalid portfolio name: {name!r}")
+    return os.path.join(base_dir, "portfolios", name, DATA_NAME)
+
+def list_portfolios(base_dir: str) -> List[str]:
+    root = os.path.join(base_dir, "portfolios")
+    names = sorted(n for n in os.listdir(root) if valid_portfolio_name(n) and os.path.isdir(os.path.join(root, n))) if os.path.isdir(root) else []
+    return [DEFAULT_PORTFOLIO] + names
+
+def create_portfolio(base_dir: str, name: str) -> str:
+    path = portfolio_file(base_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    store = PortfolioStore(path)
+    if store.load() is None: store.compact(new_portfolio())
+    return path
+
+def apply_record(data: Dict[str, Any], rec: Dict[str, Any]) -> None:
+    op = rec.get("op")
+    if op == "set": data[rec["key"]] = rec["value"]
+    elif op == "hold": data.setdefault("holdings", {})[rec["ticker"]] = rec["value"]
+    elif op == "del": data.setdefault("holdings", {}).pop(rec["ticker"], None)
+
+class FileLock:
+    """Exclusive lock shared by threads and processes (flock on `path`); re-entrant within a thread."""
+    def __init__(self, path: str):
+        self.path = path; self._rlock = threading.RLock(); self._depth = 0; self._f = None
+
+    def __enter__(self) -> "FileLock":
+        self._rlock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._f = open(self.path, "a+b"); fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._f: self._f.close(); self._f = None
+                self._rlock.release(); raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._f is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN); self._f.close(); self._f = None
+        self._rlock.release()
+
+_MISSING = object()
+
+def _diff(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    recs = []
+    for k, v in new.items():
+        if k != "holdings" and (k not in old or old[k] != v): recs.append({"op": "set", "key": k, "value": v})
+    new_h = new.get("holdings", {}); old_h = old.get("holdings", {})
+    for t, r in new_h.items():
+        if old_h.get(t) != r: recs.append({"op": "hold", "ticker": t, "value": r})
+    for t in old_h:
+        if t not in new_h: recs.append({"op": "del", "ticker": t})
+    return recs
+
+def _row(rec: Dict[str, Any]) -> Tuple[str, str]:
+    return ("top", rec["key"]) if rec["op"] == "set" else ("hold", rec["ticker"])
+
+def _row_value(data: Dict[str, Any], row: Tuple[str, str]) -> Any:
+    return data.get(row[1], _MISSING) if row[0] == "top" else data.get("holdings", {}).get(row[1], _MISSING)
+
+class PortfolioStore:
+    """One portfolio's files, shared by every session of the process.
+
+    snapshot() hands out copies tagged with a revision; save() writes only the rows that differ and,
+    given the revision the caller started from, keeps changes other sessions made in the meantime.
+    """
+    def __init__(self, path: str, compact_records: int = COMPACT_RECORDS):
+        self.path = path
+        stem = os.path.splitext(path)[0]
+        self.journal_path = stem + ".journal"; self.snap_path = stem + ".snap"
+        self.compact_records = compact_records
+        self._flushed: Dict[str, Any] = {}   # copy of what is on disk; saves are diffed against it
+        self._sig: Optional[tuple] = None    # (snapshot, journal) stat when _flushed was last in sync
+        self._journal_len = 0; self._journal_bytes = 0
+        self.rev = 0                         # bumped by every change, ours or another process's
+        self._row_rev: Dict[Tuple[str, str], int] = {}
+        self._log: List[Tuple[int, Tuple[str, str], Any]] = []   # (rev, row, value before that rev)
+        self._horizon = 0                    # _log is complete for revisions after this
+        self._lock = FileLock(stem + ".lock")
+
+    def _files_sig(self) -> tuple:
+        return _stat(self.path), _stat(self.journal_path)
+
+    def _read_snapshot(self) -> Dict[str, Any]:
+        sig = _stat(self.path)
+        if sig[1] >= BINARY_MIN_BYTES:
+            try:
+                with open(self.snap_path, "rb") as f: snap_sig, data = pickle.load(f)
+                if tuple(snap_sig) == sig: return data
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError): pass
+        with open(self.path, "rb") as f: data = _loads(f.read())
+        if sig[1] >= BINARY_MIN_BYTES: self._write_binary(data, sig)
+        return data
+
+    def _write_binary(self, data: Dict[str, Any], sig: Optional[Tuple[int, int]]) -> None:
+        if sig is not None and sig[1] >= BINARY_MIN_BYTES:
+            try: atomic_write(self.snap_path, pickle.dumps((sig, data), protocol=pickle.HIGHEST_PROTOCOL))
+            except OSError: pass   # only a load-time shortcut
+        elif os.path.exists(self.snap_path): os.remove(self.snap_path)
+
+    def snapshot(self) -> Tuple[Optional[Dict[str, Any]], int]:
+        """(copy of the data or None if there is none yet, revision to pass back to save())."""
+        with self._lock:
+            self._sync()
+            return (_clone(self._flushed) if self._flushed else None), self.rev
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Snapshot with the journal replayed on top, or None if there is no data file yet.
+
+        Each call returns a fresh copy; the files are only re-read when their mtime/size changed.
+        """
+        return self.snapshot()[0]
+
+    def _sync(self) -> None:
+        # files changed by another process (or never read): reload, and log which rows changed
+        if self._sig is not None and self._files_sig() == self._sig: return
+        old = self._flushed if self._sig is not None else None
+        self._load_files()
+        if old is not None: self._note(_diff(old, self._flushed), old)
+
+    def _note(self, recs: List[Dict[str, Any]], before: Dict[str, Any]) -> None:
+        if not recs: return
+        self.rev += 1
+        for r in recs:
+            row = _row(r); self._row_rev[row] = self.rev; self._log.append((self.rev, row, _row_value(before, row)))
+        if len(self._log) > LOG_ROWS:
+            cut = len(self._log) - LOG_ROWS // 2
+            self._horizon = self._log[cut - 1][0]; del self._log[:cut]
+
+    def _base_value(self, row: Tuple[str, str], base_rev: int) -> Any:
+        """Value `row` had at base_rev, or None if the log no longer reaches back that far."""
+        if base_rev < self._horizon: return None
+        for rev, r, before in self._log:
+            if rev > base_rev and r == row: return (before,)
+        return (_row_value(self._flushed, row),)
+
+    def _load_files(self) -> None:
+        data = self._read_snapshot() if os.path.exists(self.path) else None
+        n = good = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try: rec = json.loads(line)
+                    except ValueError: break
+                    if not line.endswith(b"\n"): break
+                    if data is None: data = {"holdings": {}}
+                    apply_record(data, rec); n += 1; good += len(line)
+            if good != os.path.getsize(self.journal_path):
+                # torn tail from an interrupted append: drop it so later appends start on a clean line
+                with open(self.journal_path, "r+b") as f: f.truncate(good)
+        self._journal_len = n; self._journal_bytes = good
+        self._flushed = data if data is not None else {}
+        if data is not None and needs_migration(data):
+            migrate(data); self._write_snapshot()   # migrate once and persist, so later loads skip it
+        else: self._sig = self._files_sig()
+
+    def save(self, data: Dict[str, Any], base_rev: Optional[int] = None,
+             on_saved: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Tuple[int, List[str], int]:
+        """Write the rows of `data` that differ from what is stored. Returns (rows written, conflicts, revision).
+
+        With `base_rev` (from snapshot()), rows another session changed after it are left alone unless
+        `data` changed them too; those rows (holding tickers, or top-level keys like "cash_uninvested") are returned
+        as conflicts and keep the other session's value.
+        `on_saved` is called with the data as stored (read-only), still under the lock, so whatever has to
+        follow the portfolio (the ledger) is updated from the rows that were kept, not from `data`.
+        The returned revision is the one `data` is now current at, to pass to the next save(): the new one,
+        or still `base_rev` when other sessions' changes came in meanwhile (reload to pick those up).
+        """
+        with self._lock:
+            self._sync(); current = base_rev is None or base_rev == self.rev
+            if not self._flushed: self._flushed = {"holdings": {}}   # first save: holdings exist even while empty
+            recs = _diff(self._flushed, data); conflicts: List[str] = []
+            if base_rev is not None and base_rev < self.rev:
+                keep = []
+                for r in recs:
+                    row = _row(r)
+                    if self._row_rev.get(row, 0) <= base_rev: keep.append(r); continue
+                    base = self._base_value(row, base_rev)   # stale copy of someone else's row: drop quietly
+                    if base is None or base[0] != (r["value"] if r["op"] != "del" else _MISSING):
+                        conflicts.append(row[1])
+                recs = keep
+            if not recs:
+                if on_saved is not None: on_saved(self._flushed)
+                return 0, conflicts, (self.rev if current else base_rev)
+            try:
+                lines = "".join(_dumps(r) + "\n" for r in recs).encode("utf-8"); snap = _stat(self.path)
+                if (snap is None or self._journal_len + len(recs) >= self.compact_records
+                        or self._journal_bytes + len(lines) > max(COMPACT_BYTES, snap[1])):
+                    self._note(recs, self._flushed)
+                    for r in recs: apply_record(self._flushed, _clone(r))
+                    self._write_snapshot()
+                else:
+                    with open(self.journal_path, "ab") as f:
+                        f.write(lines); f.flush(); os.fsync(f.fileno())
+                    self._note(recs, self._flushed)
+                    for r in recs: apply_record(self._flushed, _clone(r))
+                    self._journal_len += len(recs); self._journal_bytes += len(lines); self._sig = self._files_sig()
+            except BaseException:
+                self._sig = None   # re-read from disk next time
+                raise
+            if on_saved is not None: on_saved(self._flushed)
+            return len(recs), conflicts, (self.rev if current else base_rev)
+
+    def record_prices(self, quotes: Dict[str, Tuple[float, float]]) -> int:
+        """Store {ticker: (price, fetched at epoch)} as last_prices / price_updated for held tickers. Returns rows written."""
+        with self._lock:
+            self._sync()
+            held = self._flushed.get("holdings", {}); stamps = dict(self._flushed.get("price_updated") or {})
+            prices = dict(self._flushed.get("last_prices") or {})
+            for t, (p, fetched) in quotes.items():
+                if t in held: prices[t] = p; stamps[t] = datetime.fromtimestamp(fetched).isoformat(timespec="seconds")
+            if not stamps: return 0
+            return self.save({**self._flushed, "last_prices": prices, "price_updated": stamps,
+                              "last_updated": max(stamps.values())})[0]
+
+    def compact(self, data: Dict[str, Any]) -> None:
+        """Replace the stored data with `data`, as one snapshot file."""
+        with self._lock:
+            self._sync()
+            self._note(_diff(self._flushed, data), self._flushed)
+            self._flushed = _clone(data); self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        atomic_write(self.path, json.dumps(self._flushed, indent=2).encode("utf-8"))
+        if os.path.exists(self.journal_path): os.remove(self.journal_path)
+        self._journal_len = 0; self._journal_bytes = 0
+        self._sig = self._files_sig()
+        self._write_binary(self._flushed, self._sig[0])
@@ -0,0 +1,166 @@
+# MKK Investment Tracker — valuation history
+# - Daily closes per ticker kept in bars/<TICKER>.npy next to the data file; only missing date ranges are fetched
+# - Portfolio value, net invested, dividends and total return per trading day, computed from ledger entries
+#   and the stored closes with array operations (no per-day Python loops)
+# - Closes and ledger amounts can be scaled per ticker (pence to pounds, then into one display currency)
+
+import io, os, re, threading
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Mapping, Optional
+import numpy as np, pandas as pd
+from storage import atomic_write
+import ledger as ledger_mod
+
+BAR = np.dtype([("day", "<i4"), ("close", "<f8")])
+DEFAULT_YEARS = 5
+EPOCH = date(1970, 1, 1)
+
+def to_date(day: int) -> date:
+    return EPOCH + timedelta(days=int(day))
+
+def last_complete_day(today: Optional[date] = None) -> int:
+    """Most recent weekday before today — the newest bar that can be final."""
+    d = (today or date.today()) - timedelta(days=1)
+    while d.weekday() >= 5: d -= timedelta(days=1)
+    return ledger_mod.to_day(d)
+
+class BarStore:
+    def __init__(self, base_dir: str):
+        self.dir = os.path.join(base_dir, "bars"); os.makedirs(self.dir, exist_ok=True)
+        self._mem: Dict[str, tuple] = {}      # ticker -> (mtime, bars)
+        self._checked: Dict[str, tuple] = {}  # ticker -> (from, through) days already asked for, this process
+        self._lock = threading.Lock()
+
+    def _file(self, ticker: str) -> str:
+        return os.path.join(self.dir, re.sub(r"[^A-Za-z0-9._=^-]", "_", ticker) + ".npy")
+
+    def bars(self, ticker: str) -> np.ndarray:
+        path = self._file(ticker)
+        if not os.path.exists(path): return np.zeros(0, dtype=BAR)
+        mtime = os.path.getmtime(path); hit = self._mem.get(ticker)
+        if hit and hit[0] == mtime: return hit[1]
+        arr = np.load(path); self._mem[ticker] = (mtime, arr)
+        return arr
+
+    def _save(self, ticker: str, arr: np.ndarray) -> None:
+        buf = io.BytesIO(); np.save(buf, arr); atomic_write(self._file(ticker), buf.getvalue())
+
+    def missing_from(self, ticker: str, start_day: int) -> Optional[int]:
+        """First day that still has to be fetched for ticker, or None if its bars are complete.
+
+        A range already asked for today is not asked again, even if Yahoo had nothing for it.
+        """
+        arr = self.bars(ticker); end = last_complete_day()
+        if start_day > end: return None   # opened today: no final bar yet
+        if not len(arr) or start_day < int(arr["day"][0]) - 7: frm = start_day
+        elif int(arr["day"][-1]) < end: frm = int(arr["day"][-1]) + 1
+        else: return None
+        asked = self._checked.get(ticker)
+        return None if asked and asked[0] <= frm and asked[1] == end else frm
+
+    def update(self, starts: Dict[str, int], fetch: Callable[..., Dict[str, pd.Series]]) -> int:
+        """Fetch the missing ranges (one batched call per distinct start day). Returns tickers updated."""
+        todo: Dict[int, List[str]] = {}
+        for t, start in starts.items():
+            frm = self.missing_from(t, start)
+            if frm is not None: todo.setdefault(frm, []).append(t)
+        end = last_complete_day(); updated = 0
+        for frm, tickers in todo.items():
+            got = fetch(tickers, to_date(frm).isoformat(), to_date(end + 1).isoformat())
+            with self._lock:
+                for t in tickers:
+                    self._checked[t] = (frm, end)
+                    closes = got.get(t)
+                    if closes is None or not len(closes): continue
+                    new = np.zeros(len(closes), dtype=BAR)
+                    new["day"] = (pd.to_datetime(closes.index).tz_localize(None).normalize() - pd.Timestamp(EPOCH)).days
+                    new["close"] = closes.to_numpy(dtype=float)
+                    merged = np.concatenate([self.bars(t), new])
+                    # keep the newest value for each day
+                    _, keep = np.unique(merged["day"][::-1], return_index=True)
+                    self._save(t, merged[::-1][keep]); updated += 1
+        return updated
+
+    def closes(self, tickers: Iterable[str]) -> pd.DataFrame:
+        """Trading days × tickers of closes, forward-filled over each ticker's gaps."""
+        cols = {}
+        for t in tickers:
+            arr = self.bars(t)
+            if len(arr): cols[t] = pd.Series(arr["close"], index=arr["day"])
+        if not cols: return pd.DataFrame()
+        return pd.DataFrame(cols).sort_index().ffill()
+
+def _event_frame(recs: np.ndarray, names: List[str], keep: Iterable[str]) -> pd.DataFrame:
+    """Ledger entries as running shares / net cash in / dividends per ticker, in trade-date order.
+
+    An entry dated before a SET/CLOSE falls in the segment that reset ends, whenever it was appended, and a
+    dividend appended after such a reset is left out: the rules the ledger's aggregates follow, so the last
+    day agrees with the holdings.
+    """
+    ev = pd.DataFrame({"day": recs["day"], "tid": recs["tid"], "kind": recs["kind"],
+                       "shares": recs["shares"], "amount": recs["amount"]})
+    ev["ticker"] = np.asarray(names, dtype=object)[ev["tid"].to_numpy()]
+    ev = ev[ev["ticker"].isin(set(keep))]
+    # a dividend appended after a SET/CLOSE dated later than it is already in that position (as in the ledger)
+    k = ev["kind"].to_numpy(); resets = (k == ledger_mod.SET) | (k == ledger_mod.CLOSE)
+    since = pd.Series(np.where(resets, ev["day"].to_numpy(), np.iinfo(np.int32).min), index=ev.index).groupby(ev["tid"]).cummax()
+    ev = ev[~((k == ledger_mod.DIV) & (ev["day"] < since))]
+    ev = ev.sort_values(["tid", "day"], kind="stable")
+    k = ev["kind"].to_numpy(); s = ev["shares"].to_numpy(); a = ev["amount"].to_numpy()
+    reset = (k == ledger_mod.SET) | (k == ledger_mod.CLOSE)
+    # a reset row carries the absolute value and starts a new segment; other rows carry deltas
+    ev["d_shares"] = np.select([k == ledger_mod.BUY, k == ledger_mod.SELL, k == ledger_mod.SET], [s, -s, s], 0.0)
+    ev["d_cash"] = np.select([k == ledger_mod.BUY, k == ledger_mod.SELL, k == ledger_mod.SET], [a, -a, a], 0.0)
+    ev["d_divs"] = np.where(k == ledger_mod.DIV, a, 0.0)
+    ev["seg"] = pd.Series(reset, index=ev.index).groupby(ev["tid"]).cumsum()
+    ev["seg_div"] = pd.Series(k == ledger_mod.CLOSE, index=ev.index).groupby(ev["tid"]).cumsum()
+    ev["shares_after"] = ev.groupby(["tid", "seg"])["d_shares"].cumsum()
+    ev["cash_after"] = ev.groupby(["tid", "seg"])["d_cash"].cumsum()
+    ev["divs_after"] = ev.groupby(["tid", "seg_div"])["d_divs"].cumsum()
+    return ev
+
+def _on_days(ev: pd.DataFrame, col: str, days: np.ndarray) -> pd.DataFrame:
+    wide = ev.groupby(["day", "ticker"])[col].last().unstack()
+    idx = np.union1d(wide.index.to_numpy(), days)
+    return wide.reindex(idx).ffill().reindex(days).fillna(0.0)
+
+def _scaled(wide: pd.DataFrame, factor: Optional[Mapping[str, float]]) -> pd.DataFrame:
+    if factor is None: return wide
+    return wide * pd.Series(factor, dtype=float).reindex(wide.columns).fillna(1.0).to_numpy()
+
+def portfolio_history(ledger: "ledger_mod.Ledger", bars: BarStore, tickers: Iterable[str],
+                      price_factor: Optional[Mapping[str, float]] = None,
+                      amount_factor: Optional[Mapping[str, float]] = None) -> pd.DataFrame:
+    """Per trading day: Value, Net Invested, Dividends, Total Return and Total Return % for the given holdings.
+
+    `price_factor` / `amount_factor` (per ticker) multiply the closes and the ledger amounts, e.g. to bring
+    holdings in different currencies to one; tickers left out keep a factor of 1.
+    """
+    tickers = list(tickers); recs = np.array(ledger.records())
+    if not tickers or not len(recs): return pd.DataFrame()
+    ev = _event_frame(recs, ledger.tickers, tickers)
+    closes = bars.closes(tickers)
+    if ev.empty or closes.empty: return pd.DataFrame()
+    days = closes.index.to_numpy(); days = days[days >= int(ev["day"].min())]
+    if not len(days): return pd.DataFrame()
+    closes = _scaled(closes.reindex(days), price_factor)
+    shares = _on_days(ev, "shares_after", days).reindex(columns=closes.columns, fill_value=0.0)
+    cash = _scaled(_on_days(ev, "cash_after", days), amount_factor).sum(axis=1)
+    divs = _scaled(_on_days(ev, "divs_after", days), amount_factor).sum(axis=1)
+    value = (shares * closes).sum(axis=1, min_count=1).fillna(0.0)
+    total = value - cash + divs
+    out = pd.DataFrame({"Value": value, "Net Invested": cash, "Dividends": divs, "Price Return": value - cash,
+                        "Total Return": total, "Total Return %": np.where(cash > 0, total / cash * 100.0, np.nan)})
+    out.index = pd.to_datetime(days, unit="D"); out.index.name = "Date"
+    return out
+
+def history_starts(ledger: "ledger_mod.Ledger", tickers: Iterable[str], years: int = DEFAULT_YEARS) -> Dict[str, int]:
+    """Day each ticker's bars need to start from: its first ledger entry, capped at `years` back."""
+    recs = ledger.records(); floor = ledger_mod.to_day(date.today()) - 365*years
+    first = {}
+    if len(recs):
+        day = np.asarray(recs["day"]); tid = np.asarray(recs["tid"])
+        order = np.lexsort((day, tid)); tid_s = tid[order]
+        firsts = np.flatnonzero(np.r_[True, tid_s[1:] != tid_s[:-1]])
+        first = {ledger.tickers[int(tid_s[i])]: int(day[order][i]) for i in firsts}
+    return {t: max(first.get(t, floor), floor) for t in tickers}
@@ -1,17 +1,23 @@
 
-# MKK Investment Tracker — v1.8.8
+# MKK Investment Tracker — v1.9.0
 # - Portfolio: color-coded Overall Return $ & %, subtle row striping, right-aligned numbers
 # - Top metrics: colored Overall Return "card" (green/red)
 # - True ADA: color-coded Return vs True ADA %, striping
 # - Keeps delete holding, dividend last amount/date, migration, backup
+# - Startup draws the title and the last known totals (shell.json) before pandas and the app modules are imported
+#   and the portfolio is parsed; yfinance is only imported once a refresh needs it (market_data)
 
-import json, os, re, shutil, sys
+import gzip, itertools, json, os, re, shutil, sys, time
 from datetime import datetime, date
-from typing import Dict, Any
-import streamlit as st, yfinance as yf, pandas as pd, numpy as np
+from typing import Any, Dict, Iterable, Optional
+import streamlit as st
+import perf, storage
+from storage import PortfolioStore, new_portfolio, migrate, DEFAULT_PORTFOLIO
 
 APP_NAME = "MKK Investment Tracker"
 st.set_page_config(page_title=APP_NAME, page_icon="💠", layout="wide")
+RUN = perf.start()
+COLD = "market_data" not in sys.modules   # first run in this process: the imports below aren't loaded yet
 
 def _data_path()->str:
     if sys.platform == "darwin":
@@ -26,47 +32,174 @@ def _data_path()->str:
             except Exception: pass
     return newp
 
-DATA_FILE = _data_path()
-
-def load_data() -> Dict[str, Any]:
-    if not os.path.exists(DATA_FILE):
-        return {"holdings": {}, "cash_uninvested": 0.0,
-                "settings": {"currency":"USD","auto_price": True},
-                "last_prices": {}, "last_updated": None, "version":"1.8.8"}
-    with open(DATA_FILE,"r",encoding="utf-8") as f:
-        d = json.load(f)
-    d.setdefault("settings", {})
-    d["settings"].setdefault("currency","USD")
-    d["settings"].setdefault("auto_price", True)
-    d.setdefault("last_prices", {}); d.setdefault("last_updated", None)
-    d.setdefault("cash_uninvested", 0.0); d["version"]="1.8.8"
-    for rec in d.get("holdings", {}).values():
-        rec.setdefault("purchase_price", None)
-        rec.setdefault("dividends_collected", 0.0)
-        rec.setdefault("last_div_amount", 0.0)
-        rec.setdefault("last_div_date", "")
-        rec.setdefault("summary","")
-    return d
-
-def save_data(data: Dict[str, Any]) -> None:
-    with open(DATA_FILE,"w",encoding="utf-8") as f: json.dump(data,f,indent=2)
-
-DATA = load_data()
+@st.cache_resource(show_spinner=False)
+def data_dir()->str:
+    # the directory and the one-time copy of an old portfolio_data.json are settled once per process
+    return os.path.dirname(_data_path())
+
+BASE_DIR = data_dir()   # market data cache and price bars are shared by all portfolios
+
+# ---------------------- Portfolio selection ----------------------
+def _create_portfolio():
+    name = st.session_state.get("new_portfolio_name", "").strip()
+    if not storage.valid_portfolio_name(name):
+        st.session_state["portfolio_error"] = "Use letters, digits, spaces, '.', '-' or '_' (max 64)."; return
+    storage.create_portfolio(BASE_DIR, name)
+    st.session_state["portfolio"] = name; st.session_state["new_portfolio_name"] = ""
+
+PORTFOLIOS = storage.list_portfolios(BASE_DIR)
+if st.session_state.get("portfolio") not in PORTFOLIOS:
+    # a portfolio can be bookmarked with ?portfolio=<name>
+    st.session_state["portfolio"] = st.query_params.get("portfolio") if st.query_params.get("portfolio") in PORTFOLIOS else DEFAULT_PORTFOLIO
+PORTFOLIO = st.sidebar.selectbox("Portfolio", PORTFOLIOS, key="portfolio")
+if st.query_params.get("portfolio", DEFAULT_PORTFOLIO) != PORTFOLIO: st.query_params["portfolio"] = PORTFOLIO
+with st.sidebar.expander("➕ New portfolio"):
+    st.text_input("Name", key="new_portfolio_name", placeholder="Retirement")
+    st.button("Create", on_click=_create_portfolio)
+    if "portfolio_error" in st.session_state: st.error(st.session_state.pop("portfolio_error"))
+
+DATA_FILE = storage.portfolio_file(BASE_DIR, PORTFOLIO)
+SHELL_FILE = os.path.join(os.path.dirname(DATA_FILE), "shell.json")
+
+def read_shell()->Dict[str, Any]:
+    try:
+        with open(SHELL_FILE, "r", encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+# The shell: title and last known totals, drawn while the heavy imports and the first load run
+st.title(APP_NAME)
+SHELL = st.empty(); LAST_SHELL = read_shell()
+if COLD and LAST_SHELL.get("holdings"):
+    with SHELL.container():
+        _sym = LAST_SHELL.get("sym", "$")
+        st.caption(f"Loading… last known values ({LAST_SHELL['holdings']:,} holdings, {LAST_SHELL.get('ts','')})")
+        for _col, (_label, _key) in zip(st.columns(3), [("Total Invested", "total_invested"), ("Total Value (incl. Cash)", "total_value_incl_cash"), ("Overall Return", "overall")]):
+            _col.metric(_label, f"{_sym}{LAST_SHELL[_key]:,.2f}" if isinstance(LAST_SHELL.get(_key), (int, float)) else "—")
+perf.boot_mark("shell drawn")
+
+with perf.boot_step("import pandas/numpy"):
+    import pandas as pd, numpy as np
+with perf.boot_step("import app modules"):
+    import market_data
+    from market_cache import MarketCache
+    from portfolio_core import holdings_frame, portfolio_totals, merge_holdings
+    import ledger as ledger_mod
+    import timeseries
+    import dividends as dividends_mod
+    import importer
+    import scheduler
+    import fx
+    import backups
+
+@st.cache_resource(show_spinner=False)
+def portfolio_store(path: str) -> PortfolioStore:
+    # one per portfolio, shared by every session: an unchanged data file is parsed once per process
+    return PortfolioStore(path)
+
+STORE = portfolio_store(DATA_FILE)
+
+def load_data():
+    d, rev = STORE.snapshot()
+    return (new_portfolio() if d is None else d), rev
+
+_EDITS = [0]   # bumped on every save so derived views know to recompute
+_STAGED: Dict[str, Any] = {}
+
+@perf.timed("save_data")
+def save_data(data: Dict[str, Any], reconcile: Optional[Iterable[str]] = ()) -> None:
+    # staged only; everything saved during a rerun is written once by flush_data().
+    # `reconcile`: holdings whose ledger entries must match them once written (None: every holding)
+    _STAGED["data"] = data; _EDITS[0] += 1
+    if reconcile is None: _STAGED["reconcile"] = None
+    elif _STAGED.get("reconcile", ()) is not None: _STAGED["reconcile"] = _STAGED.get("reconcile", set()) | set(reconcile)
+
+@st.cache_resource(show_spinner=False)
+def snapshots(portfolio_dir: str) -> backups.SnapshotStore:
+    return backups.SnapshotStore(portfolio_dir)
+
+CONFLICT_NAMES = {"cash_uninvested": "Cash Available", "settings": "Settings"}   # top-level rows, as the user knows them
+
+@perf.timed("flush_data")
+def flush_data() -> None:
+    global DATA, BASE_REV
+    if "data" not in _STAGED: return
+    tickers = _STAGED.pop("reconcile", set())
+    def follow(stored):   # rows dropped as conflicts keep the other session's values: the ledger goes by those
+        if tickers is None or tickers: LEDGER.reconcile(stored["holdings"], tickers)
+    written, conflicts, rev = STORE.save(_STAGED.pop("data"), BASE_REV, on_saved=follow)
+    if rev < STORE.rev: DATA, BASE_REV = load_data()   # other sessions saved meanwhile: continue from their rows too
+    else: BASE_REV = rev
+    if written: snapshots(os.path.dirname(DATA_FILE)).take_later(STORE.load)   # rate-limited, off the script thread
+    if conflicts:
+        names = sorted(CONFLICT_NAMES.get(c, c) for c in conflicts)
+        st.toast("Changed in another session meanwhile, kept their version: " + ", ".join(names[:10])
+                 + ("…" if len(names) > 10 else ""), icon="⚠️")
+
+with perf.section("load_data"): DATA, BASE_REV = load_data()
+perf.boot_mark("data loaded")
+
+@st.cache_resource(show_spinner=False)
+def ledger(base_dir: str)->ledger_mod.Ledger:
+    return ledger_mod.Ledger(base_dir)
+
+with perf.section("ledger"): LEDGER = ledger(os.path.dirname(DATA_FILE)); LEDGER.catch_up()
+if not set(DATA["holdings"]) <= set(LEDGER.agg):
+    # holdings that predate the ledger start from an opening position, dated when the holding was added
+    _unseeded: Dict[str, list] = {}
+    for t, rec in DATA["holdings"].items():
+        if t not in LEDGER.agg: _unseeded.setdefault((rec.get("created") or date.today().isoformat())[:10], []).append(t)
+    for _day, _tickers in sorted(_unseeded.items()): LEDGER.reconcile(DATA["holdings"], _tickers, when=_day)
+
+@st.cache_resource(show_spinner=False)
+def bar_store()->timeseries.BarStore:
+    return timeseries.BarStore(BASE_DIR)
 
 def money_to_float(text:str)->float:
     if text is None: return 0.0
-    s=str(text).strip().replace(',','').replace('$','')
+    s=re.sub(r"[^0-9.\-]", "", str(text))   # drops thousands separators and any currency symbol
     try: return float(s) if s else 0.0
     except: return 0.0
 
-def money_str(x:float)->str:
+def money_str(x:float, sym:str="$")->str:
     if x is None or not np.isfinite(x): return ""
-    return f"${x:,.2f}"
-
-def money_input(label:str,key:str,value:float=0.0,help:str="")->float:
+    return f"{sym}{x:,.2f}"
+
+# Tables keep numeric columns; small ones go through a Styler (colors, $ / % text), large ones use the
+# grid's own number formatting and are paged so each rerun ships at most PAGE_ROWS rows
+STYLER_MAX_ROWS = 200
+PAGE_ROWS = 2000
+STRIPES = [{'selector':'tbody tr:nth-child(odd)','props':'background-color: rgba(0,0,0,0.03);'}]
+
+def _sign_css(df: pd.DataFrame) -> pd.DataFrame:
+    v = df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    return pd.DataFrame(np.select([v > 0, v < 0], ["color:#16a34a;", "color:#dc2626;"], ""), index=df.index, columns=df.columns)
+
+def table_page(n: int, key: str) -> slice:
+    """Rows to show of an n-row table; large tables get a page picker."""
+    if n <= PAGE_ROWS: return slice(None)
+    pages = -(-n // PAGE_ROWS)
+    page = int(st.number_input(f"Page (1–{pages})", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page"))
+    st.caption(f"Rows {(page-1)*PAGE_ROWS+1:,}–{min(page*PAGE_ROWS, n):,} of {n:,}")
+    return slice((page-1)*PAGE_ROWS, page*PAGE_ROWS)
+
+def show_table(df: pd.DataFrame, money=(), pct=(), signed=(), height=None, slot=None, sym: str = "$") -> None:
+    """Green/red `signed` columns on small tables; on large ones they show an explicit +/- sign instead."""
+    slot = slot or st
+    money = [c for c in money if c in df]; pct = [c for c in pct if c in df]; signed = [c for c in signed if c in df]
+    if len(df) <= STYLER_MAX_ROWS:
+        sty = df.style.format({**{c: sym + "{:,.2f}" for c in money}, **{c: "{:,.2f}%" for c in pct}}, na_rep="")
+        if signed: sty = sty.apply(_sign_css, axis=None, subset=signed)
+        sty = sty.set_properties(subset=money+pct, **{"text-align":"right"}).set_table_styles(STRIPES)
+        slot.dataframe(sty, use_container_width=True, height=height, hide_index=True)
+        return
+    cfg = {c: st.column_config.NumberColumn(format=sym.replace("%", "%%") + ("%+.2f" if c in signed else "%.2f")) for c in money}
+    cfg.update({c: st.column_config.NumberColumn(format="%+.2f%%" if c in signed else "%.2f%%") for c in pct})
+    slot.dataframe(df, column_config=cfg, use_container_width=True, height=height, hide_index=True)
+
+def money_input(label:str,key:str,value:float=0.0,help:str="",sym:str="$")->float:
     st.write(label)
-    default = money_str(value)
-    txt = st.text_input(label="", value=default, key=key, help=help, label_visibility="collapsed", placeholder="$0.00")
+    default = money_str(value, sym)
+    txt = st.text_input(label="", value=default, key=key, help=help, label_visibility="collapsed", placeholder=f"{sym}0.00")
     return money_to_float(txt)
 
 def shares_to_float(text: str) -> float:
@@ -82,151 +215,219 @@ def shares_input(label: str, key: str, value: float = 0.0, help: str = "", place
                         label_visibility="collapsed", placeholder=placeholder)
     return shares_to_float(txt)
 
-@st.cache_data(show_spinner=False)
-def fetch_price(ticker:str)->float:
-    try:
-        t=yf.Ticker(ticker); hist=t.history(period="5d", interval="1d")
-        if hist is None or hist.empty: return float("nan")
-        return float(hist["Close"].dropna().iloc[-1])
-    except Exception: return float("nan")
+@st.cache_resource(show_spinner=False)
+def market_cache()->MarketCache:
+    return MarketCache(os.path.join(BASE_DIR, "market_cache.sqlite"))
+
+_FETCHERS = {"meta": market_data.fetch_name_and_summary, "dividends": market_data.fetch_dividends}
 
-@st.cache_data(show_spinner=False)
+def _refresher(kind:str):
+    workers=DATA["settings"].get("fetch_workers", market_data.MAX_WORKERS)
+    return lambda tickers: {t: res for t, res, err in market_data.fetch_concurrent(_FETCHERS[kind], tickers, max_workers=workers) if err is None}
+
+@perf.timed("fetch:cache_read")
+def cached(kind:str, tickers)->Dict[str, Any]:
+    """What the disk cache holds for tickers; stale entries are served as-is and refreshed in the background."""
+    return market_cache().read(kind, tickers, refresh=_refresher(kind))
+
+def prefetch(kind:str, tickers):
+    """Fetch `kind` for tickers concurrently; yields (ticker, value or None) as each lookup lands."""
+    cache=market_cache()
+    for tkr, res, err in market_data.fetch_concurrent(_FETCHERS[kind], tickers, max_workers=DATA["settings"].get("fetch_workers", market_data.MAX_WORKERS)):
+        if err is None: cache.write(kind, {tkr: res})
+        else: cache.fail(kind, [tkr])
+        yield tkr, (res if err is None else None)
+
+@perf.timed("fetch:name_summary")
 def fetch_name_and_summary(ticker:str):
-    try:
-        tk=yf.Ticker(ticker); info=tk.info or {}
-        name=info.get("longName") or info.get("shortName") or info.get("symbol") or ticker
-        summary=info.get("longBusinessSummary") or info.get("description") or ""
-        if summary: summary=(summary[:500]+"…") if len(summary)>500 else summary
-        return name, summary
-    except Exception: return ticker, ""
-
-@st.cache_data(show_spinner=False)
-def fetch_dividend_frequency(ticker: str) -> str:
-    try:
-        t = yf.Ticker(ticker)
-        div = t.dividends
-        if div is None or len(div) < 3: return "Irregular/None"
-        dates = pd.to_datetime(div.index).sort_values()
-        cutoff = pd.Timestamp.utcnow() - pd.Timedelta(days=3*365)
-        dates = dates[dates >= cutoff]
-        if len(dates) < 3: return "Irregular/None"
-        diffs = (dates[1:] - dates[:-1]).days.values
-        if len(diffs) == 0: return "Irregular/None"
-        med = float(np.median(diffs))
-        if med <= 9: return "Weekly"
-        if med <= 45: return "Monthly"
-        if med <= 115: return "Quarterly"
-        if med <= 220: return "Semiannual"
-        if med <= 400: return "Annual"
-        return "Irregular/None"
-    except Exception:
-        return "Irregular/None"
+    have=cached("meta", [ticker])
+    if ticker in have: return tuple(have[ticker])
+    for _, res in prefetch("meta", [ticker]):
+        if res: return tuple(res)
+    return ticker, ""
+
+@st.cache_resource(show_spinner=False)
+def price_scheduler()->scheduler.PriceScheduler:
+    # one per process: the tickers of every open session are refreshed together on its worker thread
+    return scheduler.PriceScheduler(market_cache(), market_data.fetch_prices)
+
+_PRICES: Dict[str, Any] = {}
+
+@perf.timed("fetch:quotes")
+def live_quotes(tickers):
+    """Quotes the background refresher holds for tickers; missing or stale ones are queued, never fetched here.
+    Returns ({ticker: (price, fetched at)}, tickers without a quote yet)."""
+    sched=price_scheduler()
+    sched.watch(DATA_FILE, tickers, persist=STORE.record_prices)
+    live=sched.prices(tickers)
+    return live, [t for t in tickers if t not in live]
+
+def holding_currency(tkr:str)->str:
+    return DATA["holdings"][tkr].get("currency") or fx.listing_currency([tkr])[0]
+
+def build_price_snapshot():
+    """One price per holding for this rerun: the refresher's latest quote where there is one, else last saved price.
+    FX quotes for the holdings' currencies and the display currency ride along in the same batch."""
+    tickers=sorted(DATA["holdings"]); display=DATA["settings"].get("currency","USD")
+    ccys={*fx.listing_currency(tickers), *(r["currency"] for r in DATA["holdings"].values() if r.get("currency")), display}
+    fx_syms=fx.rate_symbols(ccys)
+    if tickers and DATA["settings"].get("auto_price", True): live, failed = live_quotes(tickers + fx_syms)
+    else:
+        live, failed = market_cache().rows("quote", fx_syms), []
+        if len(live) < len(fx_syms): price_scheduler().request(DATA_FILE, [s for s in fx_syms if s not in live])
+    snap={t: float(DATA["last_prices"].get(t, np.nan)) for t in tickers}
+    snap.update({t: q[0] for t, q in live.items() if t in DATA["holdings"]})
+    rates=fx.usd_rates({t: q[0] for t, q in live.items()}, ccys)
+    _PRICES.update(fx=rates, ccy=display if display in rates else "USD", wanted=display)
+    return snap, [t for t in failed if t in DATA["holdings"]]
+
+RUN.watch_cache(lambda: market_cache().stats())
 
 with st.sidebar:
     st.subheader("Settings")
-    DATA["settings"]["currency"] = st.selectbox("Currency (display only)", ["USD","EUR","GBP","JPY","CAD"],
-                                                index=["USD","EUR","GBP","JPY","CAD"].index(DATA["settings"].get("currency","USD")))
+    DATA["settings"]["currency"] = st.selectbox("Display currency", fx.CURRENCIES,
+                                                index=fx.CURRENCIES.index(DATA["settings"].get("currency","USD")) if DATA["settings"].get("currency","USD") in fx.CURRENCIES else 0,
+                                                help="Holdings keep their own currency; amounts are converted at the latest FX quotes.")
     DATA["settings"]["auto_price"] = st.checkbox("Auto-update prices from the internet",
                                                  value=DATA["settings"].get("auto_price", True))
+    DATA["settings"]["fetch_workers"] = int(st.number_input("Parallel lookups (name, summary, dividends)", min_value=1, max_value=32,
+                                                            value=int(DATA["settings"].get("fetch_workers", 8)), step=1))
     if st.button("🔄 Update all prices now"):
-        updated = 0
-        for tkr, rec in DATA["holdings"].items():
-            p = fetch_price(tkr)
-            if np.isfinite(p):
-                DATA["last_prices"][tkr] = p; updated += 1
-        DATA["last_updated"] = datetime.now().isoformat(timespec="seconds"); save_data(DATA)
-        st.success(f"Updated {updated} tickers.")
+        # queued for the background refresher; the page picks the quotes up when they land
+        price_scheduler().request(DATA_FILE, sorted(DATA["holdings"]), persist=STORE.record_prices)
+        st.toast(f"Refreshing {len(DATA['holdings']):,} prices in the background…")
     if st.button("💾 Save data"):
-        save_data(DATA); st.success("Saved.")
-
-st.title("MKK Investment Tracker")
-tab_port, tab_add, tab_edit, tab_div, tab_trueada, tab_migrate, tab_backup = st.tabs(
-    ["Portfolio","Add Holding","Edit Holdings","Dividends","True ADA","Migration","Backup"]
-)
+        save_data(DATA); flush_data(); st.success("Saved.")
+    with st.expander("Market data cache"):
+        for kind, cs in market_cache().stats().items():
+            rate = f"{cs['hit_rate']*100:.0f}%" if np.isfinite(cs['hit_rate']) else "—"
+            age = f"{cs['avg_age_s']/60:,.0f} min" if np.isfinite(cs['avg_age_s']) else "—"
+            st.caption(f"**{kind}** — served {rate} · hits {cs['hit']} · stale {cs['stale']} · misses {cs['miss']} · avg age {age}")
+    diagnostics = st.expander("⏱️ Diagnostics (this rerun)")
+
+def price_snapshot():
+    """This rerun's price snapshot, built the first time a view asks for it."""
+    if "snap" not in _PRICES: _PRICES["snap"], _PRICES["failed"] = build_price_snapshot()
+    return _PRICES["snap"], _PRICES["failed"]
+
+def display_currency()->str:
+    """The selected currency, or USD until there is a rate for it."""
+    price_snapshot(); return _PRICES["ccy"]
+
+def display_money(x:float)->str:
+    return money_str(x, fx.symbol(display_currency()))
+
+def fx_caption(frame: pd.DataFrame) -> None:
+    """Note when amounts aren't in the selected currency, or some holdings have no rate yet."""
+    if _PRICES["wanted"] != _PRICES["ccy"]: st.caption(f"No {_PRICES['wanted']} exchange rate yet — amounts are shown in USD.")
+    missing = frame["FX"].isna().to_numpy()
+    if missing.any(): st.caption(f"No exchange rate yet for {', '.join(sorted(set(frame['Currency'][missing])))} — "
+                                 f"{int(missing.sum()):,} holdings are left out of the totals.")
+
+_FRAME: Dict[str, Any] = {}
+@perf.timed("compute:portfolio_frame")
+def portfolio_frame():
+    """Holdings frame + totals, computed once per rerun and again only if something was saved since."""
+    if _FRAME.get("edits") != _EDITS[0] or _FRAME.get("data") is not DATA:
+        ccy=display_currency(); rates=_PRICES["fx"]
+        df = holdings_frame(DATA["holdings"], {**DATA["last_prices"], **price_snapshot()[0]}, ccy, rates)
+        cash = float(DATA.get("cash_uninvested",0.0)) / rates[ccy]   # cash is kept in USD
+        _FRAME.update(edits=_EDITS[0], data=DATA, df=df, totals=portfolio_totals(df, cash))
+    return _FRAME["df"], _FRAME["totals"]
+
+@perf.timed("compute:dividends")
+def dividend_view():
+    """Dividend analytics for every holding from cached dividend series (no network), memoized like portfolio_frame."""
+    frame, _ = portfolio_frame()
+    if _FRAME.get("div_edits") != _FRAME["edits"] or _FRAME.get("div_data") is not DATA:
+        series = cached("dividends", list(frame["Ticker"]))
+        long = dividends_mod.long_frame(series)
+        if len(long):   # payouts are quoted like prices: in the listing currency, maybe in pence
+            per = pd.Series(frame["Quote FX"].to_numpy(), index=frame["Ticker"])
+            long["Amount"] = long["Amount"].to_numpy() * per.reindex(long["Ticker"]).to_numpy()
+        _FRAME.update(div_edits=_FRAME["edits"], div_data=DATA, div_series=series, div=dividends_mod.analytics(long, frame))
+    return _FRAME["div"], _FRAME["div_series"]
+
+# Only the selected view runs on a rerun, so an edit in one view doesn't recompute or re-fetch the others
+VIEWS = ["Portfolio","Add Holding","Edit Holdings","Dividends","True ADA","Migration","Backup"]
+view = st.radio("View", VIEWS, horizontal=True, key="view", label_visibility="collapsed")
+
+LIVE_POLL_S = 10
+PRICE_VIEWS = ("Portfolio", "Dividends", "True ADA")
+PHASES = {"open": "market open", "extended": "pre/after-hours", "closed": "market closed"}
+
+@st.fragment(run_every=LIVE_POLL_S)
+def live_prices():
+    # fragment on a timer: polls the background refresher and reruns the page only once it has new quotes
+    sched=price_scheduler()
+    seen=st.session_state.get("quotes_seen")
+    if seen and seen[0]==DATA_FILE and sched.version(DATA_FILE) > seen[1]: st.rerun()
+    s=sched.status(); parts=[PHASES[s["phase"]]]
+    if not DATA["settings"].get("auto_price", True): parts.append("auto-update off")
+    if s["last_run"]: parts.append(f"prices refreshed {datetime.fromtimestamp(s['last_run']):%H:%M:%S}")
+    if s["pending"]: parts.append(f"{s['pending']:,} quotes queued")
+    elif s["running"] and s["next_run"] > time.time(): parts.append(f"next refresh in {s['next_run']-time.time():,.0f} s")
+    st.caption("🟢 " + " · ".join(parts) if s["phase"]=="open" else "⚪ " + " · ".join(parts))
+
+if view in PRICE_VIEWS and DATA["holdings"]:
+    st.session_state["quotes_seen"]=(DATA_FILE, price_scheduler().version(DATA_FILE))   # this run reads them
+    live_prices()
 
 # ---------------------- Portfolio ----------------------
-with tab_port:
+@st.fragment
+@perf.timed("view:history")
+def render_history(hold):
+    # fragment: toggling the chart reruns only this section, not the portfolio table above it
+    if not st.toggle("Show performance history", key="show_history"): return
+    with st.spinner("Updating daily price history…"):
+        bar_store().update(timeseries.history_starts(LEDGER, hold), market_data.fetch_daily_closes)
+    # closes are quoted in the listing currency (maybe pence), ledger amounts in the holding's: both to the display currency
+    f=portfolio_frame()[0].set_index("Ticker"); ok=np.isfinite(f["FX"]) & np.isfinite(f["Quote FX"])
+    hist=timeseries.portfolio_history(LEDGER, bar_store(), [t for t in hold if ok.get(t, False)],
+                                      price_factor=f["Quote FX"], amount_factor=f["FX"])
+    if hist.empty: st.caption("No price history yet for the ledger's entry dates."); return
+    st.line_chart(hist[["Value","Net Invested"]])
+    st.line_chart(hist[["Price Return","Total Return"]])
+    last=hist.iloc[-1]
+    st.caption(f"As of {hist.index[-1].date()}: value {display_money(last['Value'])} · dividends {display_money(last['Dividends'])} · "
+               f"total return {display_money(last['Total Return'])}" + (f" ({last['Total Return %']:.2f}%)" if np.isfinite(last['Total Return %']) else "")
+               + (" · other currencies at today's rates" if (f["Currency"] != display_currency()).any() else ""))
+
+def save_shell(totals: Dict[str, float]) -> None:
+    """Keep the totals the next cold start shows while it loads (written only when they change)."""
+    shell = {"holdings": len(DATA["holdings"]), "sym": fx.symbol(display_currency()),
+             **{k: round(float(totals[k]), 2) if np.isfinite(totals[k]) else None for k in ("total_invested", "total_value_incl_cash", "overall")}}
+    if {k: LAST_SHELL.get(k) for k in shell} == shell: return
+    try: storage.atomic_write(SHELL_FILE, json.dumps({**shell, "ts": datetime.now().strftime("%Y-%m-%d %H:%M")}).encode("utf-8"))
+    except OSError: pass
+
+def render_portfolio():
     if not DATA["holdings"]:
         st.info("No holdings yet. Add your first position in **Add Holding**.")
     else:
-        rows=[]; total_invested=0.0; total_value=0.0; total_div=0.0
-        for tkr, rec in sorted(DATA["holdings"].items()):
-            shares=float(rec.get("shares",0)); invested=float(rec.get("total_invested",0))
-            price = fetch_price(tkr) if DATA["settings"].get("auto_price", True) else float('nan')
-            if np.isnan(price): price=float(DATA["last_prices"].get(tkr,np.nan))
-            market_value = shares*price if np.isfinite(price) else np.nan
-            divs=float(rec.get("dividends_collected",0.0))
-            overall_return = (market_value - invested if np.isfinite(market_value) else 0.0) + divs
-            ret_pct = (overall_return / invested * 100.0) if invested>0 else np.nan
-            payout = fetch_dividend_frequency(tkr)
-            true_ada = ((invested - divs)/shares) if shares>0 else np.nan
-
-            rows.append({
-                "Ticker": tkr,
-                "Name": rec.get("name",""),
-                "Payout Freq": payout,
-                "Shares": round(shares,6),
-                "Purchase Price": rec.get("purchase_price", np.nan),
-                "Total Invested": invested,
-                "Price Now": price if np.isfinite(price) else np.nan,
-                "Current Value": market_value if np.isfinite(market_value) else np.nan,
-                "Dividends Collected": divs,
-                "True ADA": true_ada,
-                "Overall Return $": overall_return if np.isfinite(overall_return) else np.nan,
-                "Overall Return %": ret_pct if np.isfinite(ret_pct) else np.nan
-            })
-
-            if np.isfinite(market_value): total_value += market_value
-            total_invested += invested; total_div += divs
-
-        order = ["Ticker","Name","Payout Freq","Shares","Purchase Price","Total Invested","Price Now","Current Value","Dividends Collected","True ADA","Overall Return $","Overall Return %"]
-        df = (pd.DataFrame(rows))[order]
-
-        # Format + color + subtle striping
+        frame, totals = portfolio_frame()
+        div_stats, div_hist = dividend_view()
+        order = ["Ticker","Name","Currency","Payout Freq","Shares","Purchase Price","Total Invested","Price Now","Current Value","Dividends Collected","True ADA","Overall Return $","Overall Return %"]
+        df = frame.assign(**{"Payout Freq": np.where(frame["Ticker"].isin(list(div_hist)), div_stats["Frequency"], "…")})[order]
+        row_of = {t: i for i, t in enumerate(df["Ticker"])}; freq_col = df.columns.get_loc("Payout Freq")
+
         money_cols=["Purchase Price","Total Invested","Price Now","Current Value","Dividends Collected","True ADA","Overall Return $"]
-        pct_cols=["Overall Return %"]
-
-        def fmt_money(v): return "" if pd.isna(v) else f"${float(v):,.2f}"
-        def fmt_pct(v): return "" if pd.isna(v) else f"{float(v):,.2f}%"
-        def color_returns(v):
-            try: x=float(v)
-            except Exception: return ""
-            if not np.isfinite(x): return ""
-            if x > 0: return "color:#16a34a;"   # green-600
-            if x < 0: return "color:#dc2626;"   # red-600
-            return ""
-        stripe_css = [{'selector':'tbody tr:nth-child(odd)','props':'background-color: rgba(0,0,0,0.03);'}]
-
-        styler = (df.style
-                    .format({**{c: fmt_money for c in money_cols}, **{c: fmt_pct for c in pct_cols}})
-                    .applymap(color_returns, subset=["Overall Return $","Overall Return %"])
-                    .set_properties(subset=money_cols+pct_cols, **{"text-align":"right"})
-                    .set_table_styles(stripe_css)
-                 )
-
-        # Show without index/number column
-        try:
-            st.dataframe(styler, use_container_width=True, height=620, hide_index=True)
-        except TypeError:
-            try:
-                st.dataframe(styler.hide(axis="index"), use_container_width=True, height=620)
-            except Exception:
-                df_display = df.copy()
-                for c in money_cols: df_display[c]=df_display[c].apply(fmt_money)
-                for c in pct_cols: df_display[c]=df_display[c].apply(fmt_pct)
-                st.dataframe(df_display, use_container_width=True, height=620)
+        rows = table_page(len(df), "portfolio"); table_slot = st.empty()
+        @perf.timed("table:portfolio")
+        def draw_table(df):
+            show_table(df.iloc[rows], money=money_cols, pct=["Overall Return %"],
+                       signed=["Overall Return $","Overall Return %"], height=620, slot=table_slot, sym=fx.symbol(display_currency()))
+        draw_table(df)
+        fx_caption(frame)
 
         # Metrics (with colored Overall Return value)
-        cash=float(DATA.get("cash_uninvested",0.0))
-        overall=(total_value-total_invested)+total_div
-        overall_pct=(overall/total_invested*100.0) if total_invested>0 else np.nan
-        total_value_incl_cash=total_value+cash
+        overall=totals["overall"]; overall_pct=totals["overall_pct"]
 
         c1,c2,c3,c4,c5=st.columns(5)
-        c1.metric("Total Invested", money_str(total_invested))
-        c2.metric("Current Value (Holdings)", money_str(total_value))
-        c3.metric("Cash Available", money_str(cash))
-        c4.metric("Total Value (incl. Cash)", money_str(total_value_incl_cash))
+        c1.metric("Total Invested", display_money(totals["total_invested"]))
+        c2.metric("Current Value (Holdings)", display_money(totals["total_value"]))
+        c3.metric("Cash Available", display_money(totals["cash"]))
+        c4.metric("Total Value (incl. Cash)", display_money(totals["total_value_incl_cash"]))
 
         # Custom colored card for Overall Return value text
         color = "#16a34a" if (np.isfinite(overall) and overall>0) else ("#dc2626" if (np.isfinite(overall) and overall<0) else "#374151")
@@ -234,42 +435,75 @@ with tab_port:
         c5.markdown(f"""
 <div style="border:1px solid #e5e7eb;border-radius:10px;padding:10px 12px;">
   <div style="font-size:12px;color:#6b7280;">Overall Return</div>
-  <div style="font-size:22px;font-weight:700;color:{color};">{money_str(overall)}</div>
+  <div style="font-size:22px;font-weight:700;color:{color};">{display_money(overall)}</div>
   <div style="font-size:12px;color:#6b7280;">{pct_txt}</div>
 </div>
 """, unsafe_allow_html=True)
 
+        save_shell(totals)
+
+        st.markdown("---")
+        render_history(list(frame["Ticker"]))
+
         st.markdown("---")
         st.subheader("Cash Available")
-        new_cash = money_input("Cash Available", key="cash_available_main", value=float(DATA.get("cash_uninvested",0.0)),
+        new_cash = money_input("Cash Available", key=f"cash_available_{display_currency()}", value=totals["cash"], sym=fx.symbol(display_currency()),
                                help="This is included in Total Value (incl. Cash).")
         if st.button("Save Cash Available"):
-            DATA["cash_uninvested"] = float(new_cash); save_data(DATA); st.success("Cash Available saved.")
+            DATA["cash_uninvested"] = float(new_cash) * _PRICES["fx"][display_currency()]; save_data(DATA); st.success("Cash Available saved.")
 
         if DATA.get("last_updated"): st.caption(f"Last price update: {DATA['last_updated']}")
+        failed = price_snapshot()[1]
+        if failed: st.caption(f"No live quote yet for {len(failed):,} holdings (showing last saved price): " + ", ".join(failed[:10])
+                              + (f"… and {len(failed)-10:,} more" if len(failed) > 10 else ""))
 
         st.markdown("---"); st.subheader("Ticker Summaries")
+        slots={}
         for tkr, rec in sorted(DATA["holdings"].items()):
             with st.expander(f"{tkr} — {rec.get('name','')}"):
-                summary=rec.get("summary","")
-                if not summary:
-                    nm, sm = fetch_name_and_summary(tkr)
+                slots[tkr]=(st.empty(), st.empty())
+                if rec.get("summary"): slots[tkr][0].write(rec["summary"])
+                payout=df.iat[row_of[tkr], freq_col]
+                slots[tkr][1].markdown(f"- **Dividend Payout Frequency:** {payout}")
+
+        # Fill in network lookups as they complete instead of blocking the page on them
+        pending_freq=market_cache().missing("dividends", list(df["Ticker"]), div_hist)
+        if pending_freq:
+            with perf.section("fetch:payout"):
+                progress=st.progress(0.0, text="Fetching payout frequencies…"); last_draw=time.monotonic()
+                for i, (tkr, hist) in enumerate(prefetch("dividends", pending_freq), 1):
+                    payout=dividends_mod.frequencies(dividends_mod.long_frame({tkr: hist or []}), [tkr])[tkr]
+                    df.iat[row_of[tkr], freq_col]=payout
+                    slots[tkr][1].markdown(f"- **Dividend Payout Frequency:** {payout}")
+                    progress.progress(i/len(pending_freq), text=f"Fetching payout frequencies… {i}/{len(pending_freq)}")
+                    if time.monotonic()-last_draw > 0.5: draw_table(df); last_draw=time.monotonic()
+                draw_table(df); progress.empty()
+        backfill=[t for t, rec in DATA["holdings"].items() if not rec.get("summary")]
+        if backfill:
+            with perf.section("fetch:summaries"):
+                meta=cached("meta", backfill); filled=0
+                for tkr, res in itertools.chain(meta.items(), prefetch("meta", market_cache().missing("meta", backfill, meta))):
+                    if not res: continue
+                    nm, sm = res; rec=DATA["holdings"][tkr]
                     if not rec.get("name"): rec["name"]=nm
-                    rec["summary"]=sm; save_data(DATA); summary=sm
-                if summary: st.write(summary)
-                payout=fetch_dividend_frequency(tkr); st.markdown(f"- **Dividend Payout Frequency:** {payout}")
+                    if sm: rec["summary"]=sm; slots[tkr][0].write(sm); filled+=1
+                if filled: save_data(DATA)
 
 # ---------------------- Add Holding ----------------------
-with tab_add:
+AUTO_CCY = "Auto (from the exchange, e.g. .L → GBP)"
+
+def render_add():
     st.subheader("Add a Holding")
     with st.form("add_form", clear_on_submit=True):
         col1, col2 = st.columns(2)
         ticker = col1.text_input("Ticker", placeholder="AAPL").strip().upper()
         name = col2.text_input("Name (auto-fills if blank)", placeholder="Apple Inc.").strip()
+        currency = st.selectbox("Currency", [AUTO_CCY] + fx.CURRENCIES, help="Currency of the amounts below.")
         shares = shares_input("Shares purchased", key="add_shares", help="Supports up to 6 decimals (e.g., 100.391000).")
-        purchase_price = money_input("Purchase price per share ($, optional)", key="add_purchase_price", value=0.0)
-        total_invested = money_input("Total invested", key="add_total_invested", value=0.0, help="Include fees/commissions if applicable.")
-        dividends = money_input("Dividends collected so far", key="add_dividends", value=0.0)
+        # amounts are in the currency picked above, which a form only reports on submit: no symbol here
+        purchase_price = money_input("Purchase price per share (optional)", key="add_purchase_price", value=0.0, sym="")
+        total_invested = money_input("Total invested", key="add_total_invested", value=0.0, help="Include fees/commissions if applicable.", sym="")
+        dividends = money_input("Dividends collected so far", key="add_dividends", value=0.0, sym="")
         submitted = st.form_submit_button("Add Holding")
     if submitted:
         if not ticker or shares <= 0 or total_invested <= 0:
@@ -283,25 +517,29 @@ with tab_add:
                     "purchase_price": float(purchase_price) if purchase_price>0 else None,
                     "dividends_collected": float(dividends), "summary": auto_summary,
                     "last_div_amount": 0.0, "last_div_date": "",
-                    "created": datetime.now().isoformat(timespec="seconds")
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    **({"currency": currency} if currency != AUTO_CCY else {})
                 }
-                save_data(DATA); st.success(f"Added {ticker} — {auto_name}")
+                save_data(DATA, reconcile=[ticker]); st.success(f"Added {ticker} — {auto_name}")
 
 # ---------------------- Edit Holdings ----------------------
-with tab_edit:
+def render_edit():
     st.subheader("Edit / Update Holdings")
     if not DATA["holdings"]:
         st.info("Nothing to edit yet.")
     else:
         all_tickers=sorted(list(DATA["holdings"].keys()))
         sel=st.selectbox("Select ticker", options=all_tickers)
-        rec=DATA["holdings"][sel]
+        rec=DATA["holdings"][sel]; sym=fx.symbol(holding_currency(sel))
         with st.form("edit_form"):
             name=st.text_input("Name", value=rec.get("name",""))
+            ccy_opts=[AUTO_CCY] + fx.CURRENCIES + ([rec["currency"]] if rec.get("currency") and rec["currency"] not in fx.CURRENCIES else [])
+            currency=st.selectbox("Currency", ccy_opts, index=ccy_opts.index(rec.get("currency") or AUTO_CCY),
+                                  help="Currency of this holding's amounts.")
             shares=shares_input("Shares", key=f"edit_shares_{sel}", value=float(rec.get("shares",0)), help="Supports up to 6 decimals.")
-            total_invested=money_input("Total invested", key=f"edit_total_invested_{sel}", value=float(rec.get("total_invested",0)))
-            purchase_price=money_input("Purchase price per share ($, optional)", key=f"edit_purchase_price_{sel}", value=float(rec.get("purchase_price") or 0.0))
-            dividends=money_input("Dividends collected so far", key=f"edit_div_{sel}", value=float(rec.get("dividends_collected",0.0)))
+            total_invested=money_input("Total invested", key=f"edit_total_invested_{sel}", value=float(rec.get("total_invested",0)), sym=sym)
+            purchase_price=money_input("Purchase price per share (optional)", key=f"edit_purchase_price_{sel}", value=float(rec.get("purchase_price") or 0.0), sym=sym)
+            dividends=money_input("Dividends collected so far", key=f"edit_div_{sel}", value=float(rec.get("dividends_collected",0.0)), sym=sym)
             summary=st.text_area("Summary (auto-fetched; you can edit)", value=rec.get("summary",""), height=120)
             save_btn=st.form_submit_button("Save changes")
         if save_btn:
@@ -309,7 +547,33 @@ with tab_edit:
                                    "purchase_price": float(purchase_price) if purchase_price>0 else None,
                                    "dividends_collected": float(dividends),"summary":summary,
                                    "updated": datetime.now().isoformat(timespec="seconds")}
-            save_data(DATA); st.success(f"Updated {sel}.")
+            if currency == AUTO_CCY: DATA["holdings"][sel].pop("currency", None)
+            else: DATA["holdings"][sel]["currency"] = currency
+            save_data(DATA, reconcile=[sel]); st.success(f"Updated {sel}.")
+        with st.expander("➕ Record a buy or sell"):
+            with st.form(f"txn_form_{sel}", clear_on_submit=True):
+                tc1, tc2 = st.columns(2)
+                txn_kind = tc1.radio("Type", ["Buy","Sell"], horizontal=True)
+                txn_date = tc2.date_input("Trade date", value=date.today())
+                txn_shares = shares_input("Shares", key=f"txn_shares_{sel}")
+                txn_amount = money_input("Total cost (buy) or proceeds (sell)", key=f"txn_amount_{sel}", value=0.0, sym=sym)
+                txn_btn = st.form_submit_button("Record")
+            if txn_btn:
+                if txn_shares <= 0: st.error("Shares must be greater than 0.")
+                else:
+                    LEDGER.record(sel, ledger_mod.BUY if txn_kind=="Buy" else ledger_mod.SELL, txn_shares, txn_amount, txn_date)
+                    LEDGER.sync(DATA["holdings"], [sel]); save_data(DATA, reconcile=[sel])
+                    st.success(f"Recorded {txn_kind.lower()} of {txn_shares:,.6f} {sel}.")
+                    since = LEDGER.position(sel).get("since")
+                    if since is not None and ledger_mod.to_day(txn_date) < since:
+                        st.info(f"Dated before this position was last set ({timeseries.to_date(since)}): kept in the "
+                                "history, the shares and amount invested already include it.")
+            pos = LEDGER.position(sel)
+            st.caption(f"Open lots: {len(pos['lots'])} · Realized gain: {money_str(pos['realized'], sym)} · Ledger entries: {pos['events']}")
+            if pos["lots"]:
+                st.dataframe(pd.DataFrame({"Opened": pd.to_datetime([l[0] for l in pos["lots"]], unit="D").date,
+                                           "Shares": [l[1] for l in pos["lots"]], "Cost": [l[2] for l in pos["lots"]]}),
+                             use_container_width=True, hide_index=True)
         with st.expander("🗑️ Delete Holding"):
             st.caption("This permanently removes the selected holding from your portfolio data.")
             col_a, col_b = st.columns([1,1])
@@ -317,14 +581,14 @@ with tab_edit:
             if col_b.button("Delete Holding", disabled=not confirm, type="secondary"):
                 try:
                     del DATA["holdings"][sel]
-                    save_data(DATA)
+                    save_data(DATA, reconcile=[sel]); flush_data()
                     st.success(f"Deleted {sel}. Refreshing…")
                     st.rerun()
                 except KeyError:
                     st.error("Ticker not found.")
 
 # ---------------------- Dividends ----------------------
-with tab_div:
+def render_dividends():
     st.subheader("Quick Dividend Entry (with last amount & date)")
     if not DATA["holdings"]:
         st.info("Add a holding first.")
@@ -334,141 +598,215 @@ with tab_div:
         sel=col1.selectbox("Ticker", options=tickers)
         dflt_date = date.today()
         dt = col2.date_input("Dividend date", value=dflt_date, key=f"div_date_{sel}")
-        amt = col3.text_input("Dividend amount to add", value="$0.00", key=f"div_amt_{sel}")
-        def _money_to_float(s):
-            s = str(s).strip().replace(',', '').replace('$','')
-            try: return float(s) if s else 0.0
-            except: return 0.0
+        ccy = holding_currency(sel); sym = fx.symbol(ccy)
+        amt = col3.text_input(f"Dividend amount to add ({ccy})", value=money_str(0.0, sym), key=f"div_amt_{sel}")
         if col4.button("Add dividend"):
-            add_val = _money_to_float(amt)
-            DATA["holdings"][sel]["dividends_collected"] = float(DATA["holdings"][sel].get("dividends_collected",0.0)) + add_val
-            DATA["holdings"][sel]["last_div_amount"] = add_val
-            try:
-                DATA["holdings"][sel]["last_div_date"] = dt.isoformat()
-            except Exception:
-                DATA["holdings"][sel]["last_div_date"] = str(dt)
-            save_data(DATA); st.success(f"Added {money_str(add_val)} dividend to {sel} for {dt}.")
-
-        rows=[]; total=0.0
+            add_val = money_to_float(amt)
+            if add_val <= 0: st.error("Enter a dividend amount greater than 0.")
+            else:
+                LEDGER.record(sel, ledger_mod.DIV, 0.0, add_val, dt); LEDGER.sync(DATA["holdings"], [sel])
+                DATA["holdings"][sel]["last_div_amount"] = add_val
+                try:
+                    DATA["holdings"][sel]["last_div_date"] = dt.isoformat()
+                except Exception:
+                    DATA["holdings"][sel]["last_div_date"] = str(dt)
+                save_data(DATA, reconcile=[sel]); st.success(f"Added {money_str(add_val, sym)} dividend to {sel} for {dt}.")
+                since = LEDGER.position(sel).get("since")
+                if since is not None and ledger_mod.to_day(dt) < since:
+                    st.info(f"Dated before this position was last set ({timeseries.to_date(since)}): kept in the "
+                            "history, the dividends collected already include it.")
+
+        rows=[]
         for tkr, rec in sorted(DATA["holdings"].items()):
             d=float(rec.get("dividends_collected",0.0))
             last_amt=float(rec.get("last_div_amount",0.0))
             last_dt=rec.get("last_div_date","")
             rows.append({"Ticker":tkr,
                          "Dividends Collected": d,
-                         "Last Dividend $": last_amt,
+                         "Last Dividend": last_amt,
                          "Last Dividend Date": last_dt})
-            total+=d
-        df_div=pd.DataFrame(rows).reset_index(drop=True)
-        df_div["Dividends Collected"]=df_div["Dividends Collected"].apply(lambda v: f"${float(v):,.2f}")
-        df_div["Last Dividend $"]=df_div["Last Dividend $"].apply(lambda v: f"${float(v):,.2f}" if v else "")
-        try:
-            st.dataframe(df_div.style.set_table_styles([{'selector':'tbody tr:nth-child(odd)','props':'background-color: rgba(0,0,0,0.03);'}]), use_container_width=True, height=360, hide_index=True)
-        except TypeError:
-            try:
-                st.dataframe(df_div.style.hide(axis="index").set_table_styles([{'selector':'tbody tr:nth-child(odd)','props':'background-color: rgba(0,0,0,0.03);'}]), use_container_width=True, height=360)
-            except Exception:
-                st.dataframe(df_div, use_container_width=True, height=360)
-        st.metric("Total Dividends Collected", money_str(total))
+        frame, _ = portfolio_frame()
+        div_stats, div_hist = dividend_view()
+        df_div=pd.DataFrame(rows)
+        df_div=fx.convert(df_div, ["Dividends Collected","Last Dividend"], frame.set_index("Ticker")["FX"].reindex(df_div["Ticker"]).to_numpy())
+        total=float(np.nansum(df_div["Dividends Collected"].to_numpy()))
+        df_div=df_div.merge(
+            div_stats[["Ticker","Frequency","TTM / Share","Yield on Cost %","Yield on Market %","Fwd Annual Income","Fwd Monthly Income"]], on="Ticker", how="left")
+        df_div["Last Dividend"]=df_div["Last Dividend"].where(df_div["Last Dividend"] != 0)
+        with perf.section("table:dividends"):
+            show_table(df_div.iloc[table_page(len(df_div), "dividends")], height=360,
+                       money=["Dividends Collected","Last Dividend","TTM / Share","Fwd Annual Income","Fwd Monthly Income"],
+                       pct=["Yield on Cost %","Yield on Market %"], sym=fx.symbol(display_currency()))
+        fx_caption(frame)
+        m1,m2,m3=st.columns(3)
+        m1.metric("Total Dividends Collected", display_money(total))
+        m2.metric("Projected Annual Income", display_money(float(div_stats["Fwd Annual Income"].sum())))
+        m3.metric("Projected Monthly Income", display_money(float(div_stats["Fwd Monthly Income"].sum())))
+        if len(div_hist) < len(tickers): st.caption(f"Projections cover {len(div_hist)} of {len(tickers)} holdings with dividend history loaded (see Portfolio tab).")
+        with st.expander(f"Dividend history — {sel}"):
+            hist = LEDGER.history(sel, ledger_mod.DIV)
+            if hist.empty: st.caption("No dividends recorded yet.")
+            else: st.dataframe(hist[["Date","Amount"]], use_container_width=True, height=300, hide_index=True)
 
 # ---------------------- True ADA ----------------------
-with tab_trueada:
+def render_true_ada():
     st.subheader("True Adjusted Dividend Average (True ADA)")
     if not DATA["holdings"]:
         st.info("Add a holding first to calculate True ADA.")
     else:
-        rows=[]; sum_shares=0.0; sum_invested=0.0; sum_div=0.0
-        for tkr, rec in sorted(DATA["holdings"].items()):
-            shares=float(rec.get("shares",0.0))
-            invested=float(rec.get("total_invested",0.0))
-            divs=float(rec.get("dividends_collected",0.0))
-            true_ada = (invested - divs)/shares if shares>0 else np.nan
-            price = fetch_price(tkr) if DATA["settings"].get("auto_price", True) else float('nan')
-            if np.isnan(price): price=float(DATA["last_prices"].get(tkr, np.nan))
-            vs_true_pct = ((price - true_ada)/true_ada*100.0) if (shares>0 and np.isfinite(price) and np.isfinite(true_ada) and true_ada!=0) else np.nan
-            rows.append({
-                "Ticker": tkr,
-                "Shares": round(shares,6),
-                "Total Invested": invested,
-                "Dividends Collected": divs,
-                "True ADA": true_ada,
-                "Current Price": price if np.isfinite(price) else np.nan,
-                "Return vs True ADA %": vs_true_pct
-            })
-            sum_shares += shares; sum_invested += invested; sum_div += divs
-
-        df = pd.DataFrame(rows)
-        df_display = df.copy()
-        for c in ["Total Invested","Dividends Collected","True ADA","Current Price"]:
-            df_display[c]=df_display[c].apply(lambda v: "" if pd.isna(v) else f"${float(v):,.2f}")
-        def fmt_pct(v): return "" if pd.isna(v) else f"{float(v):,.2f}%"
-        df_display["Return vs True ADA %"]=df_display["Return vs True ADA %"].apply(fmt_pct)
-
-        def color_pct(v):
-            try: x=float(str(v).replace('%',''))
-            except: return ""
-            if not np.isfinite(x): return ""
-            if x > 0: return "color:#16a34a;"
-            if x < 0: return "color:#dc2626;"
-            return ""
-
-        try:
-            sty = (df_display.style
-                    .applymap(color_pct, subset=["Return vs True ADA %"])
-                    .set_properties(subset=["Total Invested","Dividends Collected","True ADA","Current Price","Return vs True ADA %"], **{"text-align":"right"})
-                    .set_table_styles([{'selector':'tbody tr:nth-child(odd)','props':'background-color: rgba(0,0,0,0.03);'}])
-                 )
-            st.dataframe(sty, use_container_width=True, height=520, hide_index=True)
-        except TypeError:
-            try:
-                st.dataframe(sty.hide(axis="index"), use_container_width=True, height=520)
-            except Exception:
-                st.dataframe(df_display, use_container_width=True, height=520)
-
-        if sum_shares > 0:
-            avg_cost_portfolio = (sum_invested / sum_shares)
-            true_ada_portfolio = ((sum_invested - sum_div) / sum_shares)
-            improvement_pct = ((avg_cost_portfolio - true_ada_portfolio) / avg_cost_portfolio * 100.0) if avg_cost_portfolio>0 else np.nan
-        else:
-            avg_cost_portfolio = np.nan
-            true_ada_portfolio = np.nan
-            improvement_pct = np.nan
+        frame, totals = portfolio_frame()
+        div_stats, _ = dividend_view()
+        df = frame.rename(columns={"Price Now": "Current Price"})[["Ticker","Shares","Total Invested","Dividends Collected","True ADA","Current Price","Return vs True ADA %"]]
+        net_basis = (df["Total Invested"] - df["Dividends Collected"]).to_numpy()
+        df = df.assign(**{"Fwd Annual Income": div_stats["Fwd Annual Income"].to_numpy(),
+                          "Yield on True ADA %": np.where(net_basis > 0, div_stats["Fwd Annual Income"].to_numpy() / np.where(net_basis > 0, net_basis, 1) * 100.0, np.nan)})
+        with perf.section("table:true_ada"):
+            show_table(df.iloc[table_page(len(df), "true_ada")], height=520,
+                       money=["Total Invested","Dividends Collected","True ADA","Current Price","Fwd Annual Income"],
+                       pct=["Return vs True ADA %","Yield on True ADA %"], signed=["Return vs True ADA %"], sym=fx.symbol(display_currency()))
+        fx_caption(frame)
+
+        sum_div=totals["total_div"]; avg_cost_portfolio=totals["avg_cost"]
+        true_ada_portfolio=totals["true_ada"]; improvement_pct=totals["improvement_pct"]
 
         c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Total Dividends Collected", f"${sum_div:,.2f}")
-        c2.metric("Unadjusted Avg Cost (Portfolio)", f"${avg_cost_portfolio:,.2f}" if np.isfinite(avg_cost_portfolio) else "—")
-        c3.metric("True ADA (Portfolio)", f"${true_ada_portfolio:,.2f}" if np.isfinite(true_ada_portfolio) else "—")
+        c1.metric("Total Dividends Collected", display_money(sum_div))
+        c2.metric("Unadjusted Avg Cost (Portfolio)", display_money(avg_cost_portfolio) or "—")
+        c3.metric("True ADA (Portfolio)", display_money(true_ada_portfolio) or "—")
         c4.metric("Adjusted Basis Improvement", f"{improvement_pct:.2f}%" if np.isfinite(improvement_pct) else "—")
+        fwd_income = float(div_stats["Fwd Annual Income"].sum()); net_total = totals["total_invested"] - totals["total_div"]
+        d1, d2 = st.columns(2)
+        d1.metric("Projected Annual Income", display_money(fwd_income))
+        d2.metric("Yield on True ADA (Portfolio)", f"{fwd_income/net_total*100.0:.2f}%" if net_total > 0 else "—")
 
 # ---------------------- Migration ----------------------
-with tab_migrate:
+def render_migration():
     st.subheader("Migrate from older version")
     st.caption("Import/merge a previous `portfolio_data.json` without losing your data.")
     upl=st.file_uploader("Choose previous JSON file", type=["json"])
     merge_mode=st.radio("Merge strategy", ["Add new tickers only","Overwrite existing tickers with incoming data"])
     if upl is not None and st.button("Merge now"):
         try:
-            incoming=json.load(upl); inc_holdings=incoming.get("holdings",{}); added=0; updated=0
-            for tkr, rec in inc_holdings.items():
-                rec.setdefault("last_div_amount", 0.0)
-                rec.setdefault("last_div_date", "")
-                if tkr not in DATA["holdings"]: DATA["holdings"][tkr]=rec; added+=1
-                else:
-                    if merge_mode.startswith("Overwrite"): DATA["holdings"][tkr]=rec; updated+=1
-            save_data(DATA); st.success(f"Merged successfully. Added: {added}, Updated: {updated}.")
+            incoming=migrate(json.load(upl)); inc_holdings=incoming.get("holdings",{})
+            added, updated = merge_holdings(DATA["holdings"], inc_holdings, overwrite=merge_mode.startswith("Overwrite"))
+            save_data(DATA, reconcile=inc_holdings); st.success(f"Merged successfully. Added: {added}, Updated: {updated}.")
         except Exception as e: st.error(f"Failed to merge: {e}")
 
+    st.divider()
+    st.subheader("Import broker statement")
+    st.caption("CSV transaction history or OFX/QFX statement. Buys, sells and dividends are added to your positions; "
+               "the table shows the result before anything is written. Transactions imported before are skipped, and "
+               "ones dated before a holding's opening position are kept as history only (the position includes them).")
+    stmt_file=st.file_uploader("Choose CSV / OFX file", type=["csv","ofx","qfx"], key="import_file")
+    if stmt_file is None: return
+    try: stmt=read_statement(stmt_file.file_id, stmt_file)
+    except Exception as e: st.error(f"Could not read {stmt_file.name}: {e}"); return
+    c1,c2,c3=st.columns(3)
+    c1.metric("Transactions", f"{len(stmt):,}"); c2.metric("Tickers", f"{len(stmt.names):,}")
+    c3.metric("Rows skipped", f"{stmt.skipped:,}", help="Not a buy, sell or dividend, or no symbol/date/amount.")
+    if not len(stmt): st.info("Nothing to import."); return
+    preview=import_preview(stmt_file.file_id, LEDGER.count, stmt); fresh=int(preview["New"].sum())
+    st.dataframe(preview, use_container_width=True, hide_index=True)
+    if not fresh: st.info("Every transaction in this file has been imported already."); return
+    if st.button(f"Import {fresh:,} new transactions", type="primary"):
+        with st.spinner("Importing…"):
+            n, added, updated = importer.apply(stmt, DATA["holdings"], LEDGER, created=datetime.now().isoformat(timespec="seconds"))
+            save_data(DATA, reconcile=stmt.names)
+        st.success(f"Imported {n:,} transactions ({len(stmt)-n:,} already there). Added: {added}, Updated: {updated}.")
+
+@st.cache_data(max_entries=2, show_spinner="Reading statement…")
+def read_statement(file_id: str, _upl) -> importer.Statement:
+    _upl.seek(0); return importer.read_statement(_upl, _upl.name)
+
+@st.cache_data(max_entries=4, show_spinner="Comparing with your positions…")
+def import_preview(file_id: str, ledger_count: int, _stmt: importer.Statement) -> pd.DataFrame:
+    return importer.diff(_stmt, DATA["holdings"], LEDGER)
+
 # ---------------------- Backup ----------------------
-with tab_backup:
+def restore(data, snaps: backups.SnapshotStore, source: str) -> None:
+    global DATA
+    problems = backups.validate(data)
+    if problems: st.error(f"Can't restore {source}: " + "; ".join(problems)); return
+    snaps.take(DATA, "before restore")
+    for k in backups.PRICE_KEYS:
+        if k not in data: data[k] = DATA.get(k)   # snapshots leave out the price caches; keep today's
+    DATA = migrate(data)
+    save_data(DATA, reconcile=None); flush_data(); st.success(f"Restored {source}."); st.rerun()
+
+def render_backup():
     st.subheader("Backup & Restore")
-    with open(DATA_FILE,"rb") as f:
-        st.download_button("⬇️ Download backup (JSON)", data=f, file_name=f"portfolio_backup_%s.json" % datetime.now().strftime('%Y%m%d_%H%M%S'), mime="application/json")
-    upl=st.file_uploader("Restore from JSON backup", type=["json"])
+    snaps = snapshots(os.path.dirname(DATA_FILE))
+    st.caption(f"Compressed snapshots are taken automatically after saves (at most every {backups.MIN_INTERVAL//60} min) "
+               "and share unchanged data. All from the last day are kept, then one per day for a month and one per week for a year.")
+    if st.button("📸 Take snapshot now"):
+        man = snaps.take(DATA, "manual")
+        if man: st.success(f"Snapshot taken ({man['bytes']/1024:,.1f} KB new data).")
+        else: st.info("Nothing changed since the latest snapshot.")
+    listing = snaps.list()
+    if listing:
+        st.dataframe(pd.DataFrame({"Taken": [datetime.fromtimestamp(m["ts"]).strftime("%Y-%m-%d %H:%M:%S") for m in listing],
+                                   "Reason": [m["reason"] for m in listing], "Holdings": [m["holdings"] for m in listing],
+                                   "New data (KB)": [round(m["bytes"]/1024, 1) for m in listing]}),
+                     use_container_width=True, hide_index=True, height=min(38 + 35*len(listing), 300))
+        labels = {m["id"]: f"{datetime.fromtimestamp(m['ts']):%Y-%m-%d %H:%M:%S} · {m['reason']} · {m['holdings']:,} holdings" for m in listing}
+        ids = list(labels)
+        if len(ids) > 1:
+            c1, c2 = st.columns(2)
+            old = c1.selectbox("Compare snapshot", ids, index=1, format_func=labels.get, key="snap_old")
+            new = c2.selectbox("with", ids, index=0, format_func=labels.get, key="snap_new")
+            if old != new:
+                changes = snaps.diff(*sorted([old, new]))
+                if not changes: st.caption("No differences.")
+                else:
+                    st.dataframe(pd.DataFrame([{"Item": c["item"], "Kind": c["kind"], "Change": c["change"], "Fields": ", ".join(c["fields"])}
+                                               for c in changes]), use_container_width=True, hide_index=True, height=300)
+        with st.expander("⏪ Restore a snapshot"):
+            pick = st.selectbox("Snapshot", ids, format_func=labels.get, key="snap_restore")
+            confirm = st.checkbox("Yes, replace the current portfolio with this snapshot")
+            if st.button("Restore snapshot", disabled=not confirm):
+                restore(snaps.load(pick), snaps, f"snapshot of {labels[pick].split(' · ')[0]}")
+
+    st.divider()
+    key = f"backup_file_{PORTFOLIO}"
+    if st.button("Prepare download"):
+        st.session_state[key] = (gzip.compress(json.dumps(DATA, separators=(",", ":")).encode("utf-8"), 6),
+                                 "portfolio_backup_%s.json.gz" % datetime.now().strftime('%Y%m%d_%H%M%S'))
+    if key in st.session_state:
+        blob, name = st.session_state[key]
+        st.download_button(f"⬇️ Download backup ({len(blob)/1024:,.1f} KB, gzipped JSON)", data=blob, file_name=name, mime="application/gzip")
+    upl=st.file_uploader("Restore from a backup file", type=["json","gz"])
     if upl is not None and st.button("Restore now"):
         try:
-            DATA=json.load(upl)
-            for rec in DATA.get("holdings", {}).values():
-                rec.setdefault("last_div_amount", 0.0)
-                rec.setdefault("last_div_date", "")
-            save_data(DATA); st.success("Backup restored."); st.rerun()
-        except Exception as e: st.error(f"Failed to restore: {e}")
+            raw = upl.getvalue()
+            data = json.loads(gzip.decompress(raw) if raw[:2] == b"\x1f\x8b" else raw)
+        except (OSError, ValueError) as e: st.error(f"Failed to read {upl.name}: {e}"); return
+        restore(data, snaps, upl.name)
+
+# ---------------------- Render + persist ----------------------
+SHELL.empty()
+try:
+    with perf.section(f"view:{view}"):
+        {"Portfolio": render_portfolio, "Add Holding": render_add, "Edit Holdings": render_edit, "Dividends": render_dividends,
+         "True ADA": render_true_ada, "Migration": render_migration, "Backup": render_backup}[view]()
+finally:
+    flush_data()   # also when a click interrupts the render (fast reruns) or a view raises: staged saves were already confirmed
+perf.boot_mark("first render")
+
+# ---------------------- Diagnostics ----------------------
+RUN.finish()
+with diagnostics:
+    st.caption(f"Rerun of **{view}** took **{RUN.wall*1000:,.0f} ms**")
+    boot = perf.boot_timings()
+    st.caption("Startup of this server process — imports: " + " · ".join(f"{k[7:]} {v*1000:,.0f} ms" for k, v in boot["steps"].items() if k.startswith("import "))
+               + (" (yfinance not needed yet)" if "import yfinance" not in boot["steps"] else "")
+               + " — " + " · ".join(f"{k} at {v*1000:,.0f} ms" for k, v in boot["marks"].items()))
+    if RUN.sections:
+        st.dataframe(pd.DataFrame([{"Section": k, "ms": round(v[0]*1000, 1), "Calls": v[1]} for k, v in RUN.sections.items()])
+                       .sort_values("ms", ascending=False), use_container_width=True, hide_index=True)
+    net = {k: v for k, v in RUN.counts.items() if k.startswith("yf.")}
+    st.caption("Network requests made by this rerun (background refreshes not included): " + (", ".join(f"{k} ×{v}" for k, v in sorted(net.items())) if net else "none"))
+    st.caption("Cache: " + " · ".join(f"{k} {c['hit']}/{c['stale']}/{c['miss']}" for k, c in RUN.cache.items()) + " (hit/stale/miss)")
+    DATA["settings"]["perf_log"] = st.checkbox("Append timings to perf_log.jsonl", value=bool(DATA["settings"].get("perf_log", False)))
+if DATA["settings"].get("perf_log"):
+    try: RUN.write_jsonl(os.path.join(BASE_DIR, "perf_log.jsonl"), view=view, portfolio=PORTFOLIO, holdings=len(DATA["holdings"]))
+    except OSError: pass